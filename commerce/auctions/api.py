@@ -0,0 +1,138 @@
+# A read-only JSON API over listings, bids and comments.
+#
+# Rows are read with .values(), so each page is a single query that returns plain dicts, and no model instances are
+# built. Clients can ask for many rows by ID at once (?ids=1,2,3), choose the fields they need (?fields=title,price)
+# and page through results with the same cursors as the HTML pages (?cursor=...).
+#
+# Anyone can read the API, so who bid on what and who wrote which comment are only given to logged-in users. The HTML
+# pages never list a listing's bidders, and fetching them for every listing at once shouldn't be open to scrapers.
+
+from .models import AuctionListing, Bid, ListingComment
+from .pagination import PAGE_SIZE, keyset_page
+
+
+# The most rows (and IDs) a client can ask for in one request.
+MAX_PAGE_SIZE = 100
+
+# The resources the API serves. For each one: the rows it reads, the fields a client can ask for (with the
+# lookup each is read from), the fields only logged-in users can ask for, and the filters that can be given in the
+# query string, each of which takes a list of IDs.
+# Every row always has its "id", which is also what results are ordered and paged by.
+RESOURCES = {
+    "listings": {
+        "queryset": AuctionListing.objects.all(),
+        "fields": {
+            "title": "title",
+            "description": "description",
+            "price": "current_price",
+            "image_URL": "image_URL",
+            "status": "status",
+            "category": "category__name",
+            "poster": "user_ID__username",
+            "winner": "winner__username",
+            "version": "version",
+            "bids": "bid_count",
+            "comments": "comment_count",
+            "watchers": "watcher_count",
+        },
+        "private": set(),
+        "filters": {"ids": "id__in"},
+    },
+    "bids": {
+        "queryset": Bid.objects.all(),
+        "fields": {
+            "listing": "listing_id",
+            "bidder": "user_ID__username",
+            "amount": "amount_bid",
+        },
+        "private": {"bidder"},
+        "filters": {"ids": "id__in", "listings": "listing_id__in"},
+    },
+    "comments": {
+        "queryset": ListingComment.objects.all(),
+        "fields": {
+            "listing": "listing_id",
+            "user": "user_ID__username",
+            "comment": "comment",
+        },
+        "private": {"user"},
+        "filters": {"ids": "id__in", "listings": "listing_id__in"},
+    },
+}
+
+
+# Raised for a request the API can't answer, with a message for the client.
+class ApiError(ValueError):
+    pass
+
+
+# Turns a comma-separated query string value into a list of IDs.
+def parse_ids(name, value):
+    try:
+        ids = [int(part) for part in value.split(",") if part]
+    except ValueError:
+        raise ApiError(f"{name} must be a comma-separated list of IDs.")
+
+    if len(ids) > MAX_PAGE_SIZE:
+        raise ApiError(f"At most {MAX_PAGE_SIZE} {name} can be given at once.")
+
+    return ids
+
+
+# Turns the fields query string value into the names of the fields to return. No value means every field the
+# client is allowed to see.
+def parse_fields(resource, value, authenticated):
+    available = RESOURCES[resource]["fields"]
+    private = RESOURCES[resource]["private"]
+    if not value:
+        return [name for name in available if authenticated or name not in private]
+
+    names = [name for name in value.split(",") if name and name != "id"]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ApiError(f"Unknown fields for {resource}: {', '.join(unknown)}.")
+
+    hidden = [name for name in names if name in private and not authenticated]
+    if hidden:
+        raise ApiError(f"Only logged-in users can ask for: {', '.join(hidden)}.")
+
+    return names
+
+
+# Reads the page size from the query string, keeping it between 1 and MAX_PAGE_SIZE.
+def parse_limit(value):
+    if not value:
+        return PAGE_SIZE
+
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ApiError("limit must be a number.")
+
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+# Returns one page of a resource for the given query string, as a dict ready to be sent as JSON:
+# {"results": [{"id": ..., <fields>}, ...], "next_cursor": <token or None>}. Private fields are only returned if
+# authenticated is true.
+def query(resource, params, authenticated=False):
+    spec = RESOURCES[resource]
+    names = parse_fields(resource, params.get("fields"), authenticated)
+
+    rows = spec["queryset"]
+    for name, lookup in spec["filters"].items():
+        if name in params:
+            rows = rows.filter(**{lookup: parse_ids(name, params[name])})
+
+    lookups = [spec["fields"][name] for name in names]
+    page, next_cursor = keyset_page(rows.values("id", *lookups), ("id",), params.get("cursor"),
+                                    parse_limit(params.get("limit")))
+
+    results = []
+    for row in page:
+        result = {"id": row["id"]}
+        for name, lookup in zip(names, lookups):
+            result[name] = row[lookup]
+        results.append(result)
+
+    return {"results": results, "next_cursor": next_cursor}
@@ -3,3 +3,15 @@ from django.apps import AppConfig
 
 class AuctionsConfig(AppConfig):
     name = 'auctions'
+
+    def ready(self):
+        # Connects the handler that sets SQLite's pragmas on new connections.
+        from . import sqlite
+        # Connects the handler that times queries on new connections, for request profiling.
+        from . import profiling
+        # Connects the handlers that remove saved and deleted users from the cache.
+        from . import backends
+        # Connects the handlers that keep a category's active listing count as listings are saved or deleted.
+        from . import bidding
+        # Connects the handler that deletes a deleted listing's cached cards.
+        from . import cards
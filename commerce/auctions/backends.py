@@ -0,0 +1,72 @@
+# The authentication backend, which keeps logged-in users in the cache.
+#
+# Django's AuthenticationMiddleware looks up the logged-in user with the backend they logged in with, by the user ID
+# stored in their session, which is a query on every request. CachedModelBackend keeps each user in the cache under
+# their ID instead (so all of a user's sessions share one copy), and only queries the database when the user isn't
+# there. Only the fields pages use are cached (CACHED_FIELDS), not the password hash or the staff and superuser
+# flags: the rest of a cached user's fields are loaded from the database the first time something asks for them
+# (e.g. the admin checking is_staff). Sessions are checked against a hash of the password rather than the password
+# itself, so that hash is cached instead (see User.get_session_auth_hash).
+#
+# A user is removed from the cache whenever they are saved or deleted, which covers password changes too: the hash
+# changes with the password, and Django checks it against the session on every request, so a new password still logs
+# out the user's other sessions.
+#
+# Changes made without saving the user (e.g. User.objects.filter(...).update(...)) aren't seen until the cached copy
+# runs out after USER_CACHE_TIMEOUT. So is a change made in another server process if the cache isn't shared.
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import router
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import User
+
+
+# The fields of a user that are kept in the cache.
+CACHED_FIELDS = ["id", "username", "is_active"]
+
+
+# The cache key for a user.
+def user_key(user_id):
+    return f"user:{user_id}"
+
+
+# The cached copy of a user: their CACHED_FIELDS and the hash their sessions are checked against, as a dict.
+def cached_user(user):
+    data = {name: getattr(user, name) for name in CACHED_FIELDS}
+    data["session_auth_hash"] = user.get_session_auth_hash()
+    return data
+
+
+# Turns a cached copy of a user back into a User, with the fields that weren't cached deferred.
+def rebuild_user(data, using):
+    names = [field.attname for field in User._meta.concrete_fields if field.attname in CACHED_FIELDS]
+    user = User.from_db(using, names, [data[name] for name in names])
+    user._session_auth_hash = data["session_auth_hash"]
+    return user
+
+
+# ModelBackend, which looks users up in the cache first.
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        key = user_key(user_id)
+        data = cache.get(key)
+        if data is None:
+            try:
+                user = User._default_manager.get(pk=user_id)
+            except User.DoesNotExist:
+                return None
+            cache.set(key, cached_user(user), settings.USER_CACHE_TIMEOUT)
+        else:
+            user = rebuild_user(data, router.db_for_read(User))
+
+        return user if self.user_can_authenticate(user) else None
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_user(sender, instance, **kwargs):
+    cache.delete(user_key(instance.pk))
@@ -0,0 +1,159 @@
+# Placing bids on listings.
+#
+# Bids have to be safe when many users bid on the same listing at once. Rather than reading the current price,
+# comparing it in Python and then saving, which lets a lower bid overwrite a higher one that was saved in between,
+# the comparison is done by the database as part of the UPDATE itself.
+#
+# Each category keeps a count of its active listings (Category.active_count). It goes up or down by one as listings
+# are created, closed, deleted or moved to another category (see count_active and count_category_listings), so the
+# count never means counting the category's listings. Code that adds listings with bulk_create (importing) recounts
+# the categories with recount_categories() instead, which is also how repair_counters fixes counts that drifted.
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .leaderboards import record_bid
+from .models import Category, AuctionListing, Bid
+
+# What a listing loaded without its category or status was counted in (see remember_counted_category).
+UNKNOWN = object()
+
+# Places a bid of amount on a listing for a user. The listing's price is only raised if the listing is still active
+# (and its auction hasn't ended, even if the scheduler hasn't closed it yet) and the amount is still greater than its
+# current price when the UPDATE runs. The listing's bid count goes up in the same UPDATE. The new Bid row is saved,
+# and made the listing's leading bid, and the bid is added to the listing's activity for the leaderboards, in the same
+# transaction, so a bid is either fully recorded or not at all.
+# Because a bid has to be strictly higher than the price, the earliest of two equal bids is the one that leads.
+# Returns the new Bid, or None if the bid was too low (or the listing is closed).
+def place_bid(user, listing_id, amount):
+    now = timezone.now()
+    with transaction.atomic():
+        raised = AuctionListing.objects.filter(
+            Q(ends_at__isnull=True) | Q(ends_at__gt=now),
+            id=listing_id, status="ACTIVE", current_price__lt=amount
+        ).update(current_price=amount, bid_count=F("bid_count") + 1, version=F("version") + 1)
+
+        if not raised:
+            return None
+
+        # The price before this bid: the bid this one outbid, or the starting price if it's the first. It's read now
+        # that the listing's row is locked by the UPDATE, so no other bid can come in between.
+        previous = AuctionListing.objects.filter(id=listing_id).values_list(
+            Coalesce("leading_bid__amount_bid", "starting_price"), flat=True
+        ).get()
+
+        bid = Bid.objects.create(user_ID=user, listing_id=listing_id, amount_bid=amount)
+        AuctionListing.objects.filter(id=listing_id).update(leading_bid=bid, leading_bidder=user)
+        record_bid(listing_id, amount - previous, now)
+
+        return bid
+
+
+# Closes an active listing and makes its leading bidder (if anyone has bid) the winner. This is a single-row
+# UPDATE however many bids the listing has. Only the call that actually closes the listing takes it off its
+# category's active listings.
+# Returns True if the listing was closed by this call, or False if it was already closed.
+def close_listing(listing_id):
+    with transaction.atomic():
+        closed = AuctionListing.objects.filter(id=listing_id, status="ACTIVE").update(
+            status="CLOSED", winner=F("leading_bidder"), version=F("version") + 1
+        )
+
+        if closed:
+            count_active(Category.objects.filter(listings__id=listing_id).values("id")[:1], -1)
+
+    return bool(closed)
+
+
+# Adds change (which may be negative) to the active listing count of a category, given by its ID or a subquery, in
+# one UPDATE. A count that has drifted too low stays at zero rather than going below it.
+def count_active(category_id, change):
+    categories = Category.objects.filter(id=category_id)
+    if change < 0:
+        categories = categories.filter(active_count__gte=-change)
+    categories.update(active_count=F("active_count") + change)
+
+
+# Sets the active listing counts of a queryset of categories from their listings, in one UPDATE. Used after imports
+# and to repair counts, not as listings change. Returns the number of categories.
+def recount_categories(categories):
+    active = (
+        AuctionListing.objects.filter(category=OuterRef("id"), status="ACTIVE")
+        .order_by().values("category").annotate(count=Count("id")).values("count")
+    )
+    return categories.update(active_count=Coalesce(Subquery(active), 0))
+
+
+# Closes up to batch_size active listings whose auctions ended by now, earliest first, making each one's leading
+# bidder the winner. However many listings are in the batch, this is one query to pick the batch and then two for
+# each category the batch's listings are in: an UPDATE that closes them all and sets their winners, and one that
+# takes as many listings as it closed off the category's count. Counting what the UPDATE closed (rather than the
+# batch) keeps the counts right even if an owner closed one of the listings at the same moment.
+# Returns the number of listings that were closed.
+def close_expired(now, batch_size=500):
+    with transaction.atomic():
+        batch = AuctionListing.objects.filter(status="ACTIVE", ends_at__lte=now).order_by("ends_at", "id")
+        categories = {}
+        for listing_id, category_id in batch.values_list("id", "category_id")[:batch_size]:
+            categories.setdefault(category_id, []).append(listing_id)
+
+        total = 0
+        for category_id, ids in categories.items():
+            closed = AuctionListing.objects.filter(id__in=ids, status="ACTIVE").update(
+                status="CLOSED", winner=F("leading_bidder"), version=F("version") + 1
+            )
+            count_active(category_id, -closed)
+            total += closed
+
+    return total
+
+
+# Returns when the next active listing's auction ends, or None if no active listing has an end time.
+def next_deadline():
+    return (
+        AuctionListing.objects.filter(status="ACTIVE", ends_at__isnull=False)
+        .order_by("ends_at").values_list("ends_at", flat=True).first()
+    )
+
+
+# Remembers the category and status a listing was loaded (or created) with, so that saving it knows which category
+# it was counted in, if any. Listings loaded without those fields (e.g. the cards' .only()) aren't looked up just for
+# this: saving one only writes the fields it was loaded with, so it can't change its count anyway.
+@receiver(post_init, sender=AuctionListing)
+def remember_counted_category(sender, instance, **kwargs):
+    if "status" not in instance.__dict__ or "category_id" not in instance.__dict__:
+        instance._counted_in = UNKNOWN
+    elif instance.pk is None or instance.status != "ACTIVE":
+        instance._counted_in = None
+    else:
+        instance._counted_in = instance.category_id
+
+
+# Keeps the category counts up to date as listings are saved through the ORM: a listing that was counted in one
+# category and is now active in another (or is newly created, or no longer active) moves its count by one.
+@receiver(post_save, sender=AuctionListing)
+def count_category_listings(sender, instance, **kwargs):
+    if instance._counted_in is UNKNOWN:
+        return
+    counted_in = instance.category_id if instance.status == "ACTIVE" else None
+    if counted_in == instance._counted_in:
+        return
+
+    if instance._counted_in is not None:
+        count_active(instance._counted_in, -1)
+    if counted_in is not None:
+        count_active(counted_in, 1)
+    instance._counted_in = counted_in
+
+
+# Takes a deleted listing off its category's count, if it was counted there.
+@receiver(post_delete, sender=AuctionListing)
+def uncount_category_listing(sender, instance, **kwargs):
+    if instance._counted_in is UNKNOWN:
+        recount_categories(Category.objects.filter(id=instance.category_id))
+    elif instance._counted_in is not None:
+        count_active(instance._counted_in, -1)
@@ -0,0 +1,58 @@
+# Cached listing cards for the homepage and category pages.
+#
+# A listing's card only changes when the listing does, so each rendered card is cached under the listing's ID and
+# version. Any change to a listing bumps its version (see AuctionListing.version), which means the next page view
+# renders and caches a new card and the old one is never looked at again. A page of cards takes one trip to the
+# cache, and only the listings whose cards aren't cached are loaded in full from the database.
+#
+# A deleted listing's cards are deleted from the cache with it, since a new listing can end up with the same ID, and
+# would start again at version 1.
+
+from django.core.cache import cache
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .models import AuctionListing
+
+
+# How long a rendered card is kept (in seconds). Old versions of a card drop out of the cache on their own.
+CARD_TIMEOUT = 60 * 60 * 24
+
+
+# The fields the listing pages need to find a page of listings and look up their cards.
+CARD_KEY_FIELDS = ("id", "version")
+
+
+# The cache key for one version of a listing's card.
+def card_key(listing_id, version):
+    return f"listing_card:{listing_id}:{version}"
+
+
+# Returns the rendered cards for a list of listings, in the same order. The listings only need their id and
+# version loaded, e.g. with .only(*CARD_KEY_FIELDS).
+def listing_cards(listings):
+    keys = [card_key(listing.id, listing.version) for listing in listings]
+    cards = cache.get_many(keys)
+
+    # Load and render the listings whose cards weren't in the cache, and cache them for next time.
+    missing = {listing.id: key for listing, key in zip(listings, keys) if key not in cards}
+    if missing:
+        new_cards = {}
+        for listing in AuctionListing.objects.filter(id__in=missing):
+            card = render_to_string("auctions/card.html", {"row": listing})
+            # The listing may have changed since the page was loaded, so the card is cached under the version that
+            # was actually rendered.
+            new_cards[card_key(listing.id, listing.version)] = card
+            cards[missing[listing.id]] = card
+        cache.set_many(new_cards, CARD_TIMEOUT)
+
+    return [mark_safe(cards.get(key, "")) for key in keys]
+
+
+# Deletes every version of a deleted listing's card from the cache. Versions older than the last one may still be
+# cached too, for up to CARD_TIMEOUT.
+@receiver(post_delete, sender=AuctionListing)
+def forget_cards(sender, instance, **kwargs):
+    cache.delete_many([card_key(instance.id, version) for version in range(1, instance.version + 1)])
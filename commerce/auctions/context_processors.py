@@ -0,0 +1,19 @@
+# Values that are added to the context of every template.
+
+from .models import WatchList
+
+
+# Adds the number of listings in the logged-in user's watchlist, shown in the nav bar. It's passed as a function so
+# that it's only looked up when a template uses it. Pages that have already read the user's watched listing IDs (see
+# views.watched_ids) count those; other pages only ask the database for the count, rather than loading every ID.
+def watchlist(request):
+    def watch_count():
+        if hasattr(request, "_watched_ids"):
+            return len(request._watched_ids)
+        if not request.user.is_authenticated:
+            return 0
+        return WatchList.objects.filter(user_ID=request.user).count()
+
+    return {
+        "watch_count": watch_count
+    }
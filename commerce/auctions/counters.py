@@ -0,0 +1,56 @@
+# Activity counts kept on listings: how many bids, comments and watchers each one has.
+#
+# Counting these for every card would be three COUNT queries per listing, so they are stored on the listing instead
+# and changed with F() increments and decrements in the same transaction as the bid, comment or watchlist row they
+# count (see bidding.place_bid and views.py). If they ever drift, e.g. because rows were deleted in the admin,
+# recount_listings() sets them from the rows themselves.
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import AuctionListing, WatchList, Bid, ListingComment
+
+
+# Each counter, with the model whose rows it counts and that model's foreign key to the listing.
+COUNTERS = {
+    "bid_count": (Bid, "listing"),
+    "comment_count": (ListingComment, "listing"),
+    "watcher_count": (WatchList, "single_listing_watched"),
+}
+
+
+# The true value of a counter for each listing, as an expression that can be compared with or saved to it.
+def _true_count(model, field):
+    rows = model.objects.filter(**{field: OuterRef("id")}).order_by().values(field)
+    return Coalesce(Subquery(rows.annotate(count=Count("id")).values("count")), 0)
+
+
+# Calls update with the rows of a model batch_size at a time (a queryset of a range of IDs), each batch in its own
+# transaction, so an UPDATE over a large table doesn't hold the write lock for all of it at once. update returns the
+# number of rows it changed. Returns the total.
+def update_in_batches(model, update, batch_size=5000):
+    bounds = model.objects.aggregate(first=Min("id"), last=Max("id"))
+    if bounds["first"] is None:
+        return 0
+
+    total = 0
+    for start in range(bounds["first"], bounds["last"] + 1, batch_size):
+        with transaction.atomic():
+            total += update(model.objects.filter(id__gte=start, id__lt=start + batch_size))
+
+    return total
+
+
+# Sets the counters (all of them, or the ones named) of every listing whose counters are wrong, batch_size listings
+# (by ID) at a time. Listings that are fixed get a new version, so their cards show the right numbers. Returns the
+# number of listings that were fixed.
+def recount_listings(names=COUNTERS, batch_size=5000):
+    counts = {name: _true_count(*COUNTERS[name]) for name in names}
+    wrong = Q()
+    for name, count in counts.items():
+        wrong |= ~Q(**{name: count})
+
+    return update_in_batches(
+        AuctionListing, lambda batch: batch.filter(wrong).update(version=F("version") + 1, **counts), batch_size
+    )
@@ -0,0 +1,156 @@
+# Uploaded listing images.
+#
+# An uploaded image is saved under a name made from a hash of its contents, so a name always means the same file and
+# browsers can cache it for as long as they like (see views.media). Smaller copies for the listing cards and pages
+# (thumbnails) are made in a pool of worker processes, so creating a listing doesn't wait for them. Until they're
+# ready, the listing shows the uploaded image itself.
+#
+# Pillow is an optional dependency. Without it, images can't be uploaded and listings can only link to one.
+#
+# The worker processes only run make_thumbnails(), which doesn't use Django's models or database.
+
+import hashlib
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+
+logger = logging.getLogger(__name__)
+
+# Whether images can be uploaded.
+UPLOADS_ENABLED = Image is not None
+
+# The largest image that can be uploaded, in bytes.
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+
+# The thumbnail sizes, by name, as the longest side in pixels. Cards are 18rem (288px) wide; "medium" is for
+# screens with twice as many pixels.
+SIZES = {
+    "small": 300,
+    "medium": 600,
+}
+
+
+# Where an uploaded image is saved, relative to MEDIA_ROOT and MEDIA_URL.
+def image_name(digest, extension):
+    return f"images/{digest}.{extension}"
+
+
+# Where one size of an uploaded image's thumbnails is saved, relative to MEDIA_ROOT and MEDIA_URL.
+def thumbnail_name(digest, size):
+    return f"thumbnails/{digest}-{size}.webp"
+
+
+# Writes a file under MEDIA_ROOT by writing a temporary file next to it and renaming it, so a half-written file is
+# never served. write is called with the open temporary file.
+def _write(root, name, write):
+    path = os.path.join(root, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(descriptor, "wb") as file:
+            write(file)
+        os.chmod(temporary, 0o644)
+        os.replace(temporary, path)
+    except BaseException:
+        os.remove(temporary)
+        raise
+
+
+# Saves an uploaded image (from a forms.ImageField) and returns the hash of its contents, which its name and its
+# thumbnails' names are made from, and its name. An image that was uploaded before isn't saved again.
+def save_image(upload):
+    sha = hashlib.sha256()
+    for chunk in upload.chunks():
+        sha.update(chunk)
+    digest = sha.hexdigest()[:32]
+
+    # ImageField checks the upload is an image Pillow can read, and records its format (e.g. "JPEG").
+    name = image_name(digest, upload.image.format.lower())
+    if not os.path.exists(os.path.join(settings.MEDIA_ROOT, name)):
+        def write(file):
+            for chunk in upload.chunks():
+                file.write(chunk)
+
+        _write(settings.MEDIA_ROOT, name, write)
+
+    return digest, name
+
+
+# Makes every size of thumbnail for an image and returns the image's hash. Thumbnails are WebP files that keep the
+# image's proportions within a square of each size. Runs in a worker process.
+def make_thumbnails(root, name, digest):
+    with Image.open(os.path.join(root, name)) as image:
+        # Turn photos the right way up, since the thumbnails don't keep the camera's orientation tag.
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if image.mode in ("LA", "PA") or "transparency" in image.info else "RGB")
+
+        for size, pixels in SIZES.items():
+            thumbnail = image.copy()
+            thumbnail.thumbnail((pixels, pixels))
+            _write(root, thumbnail_name(digest, size), lambda file: thumbnail.save(file, "WEBP", quality=80))
+
+    return digest
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+# The worker processes that make thumbnails, started the first time they are needed. They are started fresh
+# ("spawn") rather than forked, since forking a web server process that has threads running isn't safe.
+def _workers():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(settings.THUMBNAIL_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+# Records that a listing's thumbnails are ready. Its new version means its card is rendered again with them.
+def _thumbnails_ready(listing_id, digest):
+    from .models import AuctionListing
+
+    AuctionListing.objects.filter(id=listing_id).update(image=digest, version=F("version") + 1)
+
+
+# Called when a worker has finished a listing's thumbnails. The listing is updated in a thread of its own, since this
+# may be called in the thread that submitted the work, whose database connection belongs to a request.
+def _finished(listing_id, future):
+    try:
+        digest = future.result()
+    except Exception:
+        logger.exception("Couldn't make thumbnails for listing %s.", listing_id)
+        return
+
+    def record():
+        try:
+            _thumbnails_ready(listing_id, digest)
+        finally:
+            connection.close()
+
+    threading.Thread(target=record).start()
+
+
+# Makes the thumbnails for a listing's uploaded image (saved by save_image()) in the background, then records them on
+# the listing. With THUMBNAIL_WORKERS set to 0 they are made straight away instead.
+def make_thumbnails_later(listing_id, digest, name):
+    if not settings.THUMBNAIL_WORKERS:
+        _thumbnails_ready(listing_id, make_thumbnails(settings.MEDIA_ROOT, name, digest))
+        return
+
+    future = _workers().submit(make_thumbnails, settings.MEDIA_ROOT, name, digest)
+    future.add_done_callback(lambda future: _finished(listing_id, future))
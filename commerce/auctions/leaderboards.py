@@ -0,0 +1,100 @@
+# Leaderboards of the liveliest auctions: the most bids in the last hour, the fastest-rising prices, the most watched
+# and the ones ending soonest.
+#
+# Bidding activity is kept as rollup rows (ListingActivity), one per listing per BUCKET_SECONDS, which place_bid adds
+# to in the same transaction as the bid. The hourly boards add up the last hour's buckets, a handful of rows per
+# listing, rather than counting the Bid table (which doesn't record when bids were placed anyway). Watchers and end
+# times are already on the listings, with indexes to read them in order. The boards are computed together and
+# cached for LEADERBOARD_TIMEOUT seconds, so however busy the page is, they're worked out at most that often.
+#
+# Buckets older than the hour aren't needed; run_auction_scheduler deletes them with prune_activity().
+
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import AuctionListing, ListingActivity
+
+
+# The length of a time bucket, in seconds.
+BUCKET_SECONDS = 5 * 60
+
+# How far back the hourly boards look.
+WINDOW = timedelta(hours=1)
+
+# The number of listings on each board.
+LEADERBOARD_SIZE = 10
+
+# The names of the boards, in the order they're shown.
+BOARDS = ("most_bids", "rising", "most_watched", "ending_soon")
+
+# How long the computed boards are kept (in seconds), and the cache key they're kept under.
+LEADERBOARD_TIMEOUT = 30
+LEADERBOARD_KEY = "leaderboards"
+
+
+# The start of the bucket a time falls in.
+def bucket_of(time):
+    time = time.replace(microsecond=0)
+    return time - timedelta(seconds=int(time.timestamp()) % BUCKET_SECONDS)
+
+
+# The start of the oldest bucket in the last hour (which may have started a little over an hour ago).
+def window_start(now):
+    return bucket_of(now - WINDOW + timedelta(seconds=BUCKET_SECONDS))
+
+
+# Adds a bid to its listing's activity for the current bucket. rise is how much the bid raised the price over the bid
+# before it (or over the starting price, for a listing's first bid). Called by
+# place_bid inside its transaction, after the listing's row has been updated, so bids on the same listing take turns
+# here and the row for a bucket can't be created twice.
+def record_bid(listing_id, rise, now):
+    bucket = bucket_of(now)
+    added = ListingActivity.objects.filter(listing_id=listing_id, bucket=bucket).update(
+        bids=F("bids") + 1, price_rise=F("price_rise") + rise
+    )
+    if not added:
+        ListingActivity.objects.create(listing_id=listing_id, bucket=bucket, bids=1, price_rise=rise)
+
+
+# Deletes the buckets that are too old for the hourly boards. Returns the number of rows deleted.
+def prune_activity(now):
+    deleted, _ = ListingActivity.objects.filter(bucket__lt=window_start(now)).delete()
+    return deleted
+
+
+# The active listings with the most activity of one kind in the last hour, as (id, version, total) rows.
+def _hourly(field, now):
+    rows = (
+        ListingActivity.objects.filter(bucket__gte=window_start(now), listing__status="ACTIVE")
+        .values("listing", "listing__version")
+        .annotate(total=Sum(field))
+        .filter(total__gt=0)
+        .order_by("-total", "listing")
+    )
+    return [(row["listing"], row["listing__version"], row["total"]) for row in rows[:LEADERBOARD_SIZE]]
+
+
+# The active listings first in the given order, as (id, version, value of field) rows.
+def _top(listings, field, *ordering):
+    rows = listings.filter(status="ACTIVE").order_by(*ordering).values_list("id", "version", field)
+    return list(rows[:LEADERBOARD_SIZE])
+
+
+# Works out every board, as a dict of lists of (listing ID, listing version, value) rows, best first.
+def compute_leaderboards(now=None):
+    now = now or timezone.now()
+    return {
+        "most_bids": _hourly("bids", now),
+        "rising": _hourly("price_rise", now),
+        "most_watched": _top(AuctionListing.objects.filter(watcher_count__gt=0), "watcher_count",
+                             "-watcher_count", "-id"),
+        "ending_soon": _top(AuctionListing.objects.filter(ends_at__gt=now), "ends_at", "ends_at", "id"),
+    }
+
+
+# The boards, from the cache if they were worked out in the last LEADERBOARD_TIMEOUT seconds.
+def cached_leaderboards():
+    return cache.get_or_set(LEADERBOARD_KEY, compute_leaderboards, LEADERBOARD_TIMEOUT)
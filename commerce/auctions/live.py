@@ -0,0 +1,123 @@
+# Live updates for open listing pages, sent as Server-Sent Events (SSE).
+#
+# A listing page opens a stream to /<listing_id>/events. When a bid, close or comment happens, the view publishes a
+# message for that listing, which is encoded once and handed to every open stream for it, without any database
+# reads. The subscribers live in this process, so each ASGI worker process serves the streams of its own clients.
+# The streams are served by a small ASGI application that sits in front of Django (see commerce/asgi.py), since
+# Django 3.1 can't stream a response asynchronously.
+
+import asyncio
+import json
+import re
+import threading
+
+
+# How long a stream can be idle before a keep-alive comment is sent, so proxies don't close the connection.
+HEARTBEAT_SECONDS = 15
+
+# How many messages can wait for a slow client before newer messages for it are dropped.
+QUEUE_SIZE = 100
+
+# The path of a listing's event stream.
+EVENTS_PATH = re.compile(r"^/(\d+)/events$")
+
+# Open streams by listing ID. Each subscriber is the event loop its stream runs on and the queue it reads from.
+_subscribers = {}
+_lock = threading.Lock()
+
+
+# Registers a new stream for a listing and returns the queue its messages will arrive on.
+def subscribe(listing_id):
+    queue = asyncio.Queue(QUEUE_SIZE)
+    with _lock:
+        _subscribers.setdefault(listing_id, set()).add((asyncio.get_running_loop(), queue))
+    return queue
+
+
+# Removes a stream that has ended.
+def unsubscribe(listing_id, queue):
+    with _lock:
+        subscribers = _subscribers.get(listing_id, set())
+        subscribers.difference_update({subscriber for subscriber in subscribers if subscriber[1] is queue})
+        if not subscribers:
+            _subscribers.pop(listing_id, None)
+
+
+# Adds a message to a queue, dropping it if the client has fallen too far behind.
+def _deliver(queue, message):
+    try:
+        queue.put_nowait(message)
+    except asyncio.QueueFull:
+        pass
+
+
+# Sends an event to every open stream for a listing. It can be called from any thread, e.g. from a view.
+# Returns the number of streams it was sent to.
+def publish(listing_id, event, data):
+    with _lock:
+        subscribers = list(_subscribers.get(listing_id, ()))
+    if not subscribers:
+        return 0
+
+    message = f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+    for loop, queue in subscribers:
+        loop.call_soon_threadsafe(_deliver, queue, message)
+
+    return len(subscribers)
+
+
+# Waits until the client goes away.
+async def _disconnected(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+# Streams a listing's events to one client until it disconnects.
+async def stream_events(listing_id, receive, send):
+    queue = subscribe(listing_id)
+    disconnected = asyncio.ensure_future(_disconnected(receive))
+    try:
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream"),
+                (b"cache-control", b"no-cache"),
+                # Stops nginx from buffering the stream.
+                (b"x-accel-buffering", b"no"),
+            ],
+        })
+        # Tells the browser to wait 5 seconds before reconnecting if the stream is lost.
+        await send({"type": "http.response.body", "body": b"retry: 5000\n\n", "more_body": True})
+
+        while True:
+            message = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait(
+                {message, disconnected}, timeout=HEARTBEAT_SECONDS, return_when=asyncio.FIRST_COMPLETED
+            )
+            if disconnected in done:
+                message.cancel()
+                break
+            if message in done:
+                body = message.result()
+            else:
+                message.cancel()
+                body = b": keep-alive\n\n"
+            await send({"type": "http.response.body", "body": body, "more_body": True})
+    finally:
+        disconnected.cancel()
+        unsubscribe(listing_id, queue)
+
+
+# Wraps the Django ASGI application so that GET requests for event streams are answered here, and everything else
+# is passed on to Django.
+def with_events(application):
+    async def events_application(scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "GET":
+            match = EVENTS_PATH.match(scope["path"])
+            if match:
+                await stream_events(int(match.group(1)), receive, send)
+                return
+        await application(scope, receive, send)
+
+    return events_application
@@ -0,0 +1,42 @@
+# Helpers shared by the benchmark commands.
+#
+# Benchmarks that need several processes run them against a fresh database file in a temporary directory, so that
+# the real database is never touched. Each process sets up Django itself with the environment it is given.
+
+import os
+import random
+from decimal import Decimal
+
+import django
+
+
+# Sets up Django in this process with extra environment variables (e.g. SQLITE_PATH for the benchmark database).
+def setup_django(env):
+    os.environ.update(env)
+    os.environ["DJANGO_SETTINGS_MODULE"] = "commerce.settings"
+    django.setup()
+
+
+# Migrates the benchmark database and adds users named bench0, bench1, ... (all with the password "password") and
+# listings to it. Meant to be run in its own process.
+def seed_database(env, users, listings):
+    setup_django(env)
+
+    from django.core.management import call_command
+    from auctions.models import User, Category, AuctionListing
+
+    call_command("migrate", verbosity=0)
+
+    seeded_users = [User.objects.create_user(f"bench{i}", f"bench{i}@example.com", "password") for i in range(users)]
+    categories = list(Category.objects.all())
+    AuctionListing.objects.bulk_create([
+        AuctionListing(
+            user_ID=seeded_users[-1],
+            title=f"Listing {i}",
+            description="A description of the item. " * 20,
+            current_price=Decimal("1.00"),
+            image_URL="https://example.com/item.png",
+            category=random.choice(categories),
+        )
+        for i in range(listings)
+    ])
@@ -0,0 +1,100 @@
+# Compares full-text search through the FTS5 index with a plain icontains search on a large catalogue.
+#
+# The listings are seeded into a throwaway test database (the real database isn't touched), with titles and
+# descriptions made from a fixed vocabulary so that some words are common and others rare. Each search is run a
+# number of times and the median time is printed for both approaches. Note that icontains returns unranked results,
+# so for words that are in most listings it can stop after the first page of matches; FTS5 ranks every match.
+#
+# Usage: python manage.py benchmark_search --listings 100000
+
+import itertools
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.test.utils import setup_databases, teardown_databases
+
+from auctions.models import User, Category, AuctionListing
+from auctions.search import search_listings
+
+
+# Words used to build listing text: a few real words followed by many made-up ones. Word frequencies follow a Zipf
+# distribution, like real text, so the first words are in almost every listing and the last are in very few.
+VOCABULARY = (
+    "vintage new used classic rare large small wooden metal leather red blue green black white bright soft heavy "
+    "portable electric manual digital antique modern handmade signed boxed sealed lamp chair table guitar camera "
+    "watch bicycle jacket boots speaker novel poster record kettle blender drill hammer tent racket helmet puzzle"
+).split() + [f"word{i}" for i in range(20000)]
+
+CUMULATIVE_WEIGHTS = list(itertools.accumulate(1 / rank for rank in range(1, len(VOCABULARY) + 1)))
+
+# The searches that are timed, from common words to rare ones and a word that isn't in any listing.
+SEARCHES = ["vintage", "leather jacket", "guitar word50", "word500", "word15000", "gramophone"]
+
+
+# Picks count words from the vocabulary.
+def words(count):
+    return random.choices(VOCABULARY, cum_weights=CUMULATIVE_WEIGHTS, k=count)
+
+
+class Command(BaseCommand):
+    help = "Times FTS5 listing search against icontains on a large seeded catalogue."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--listings", type=int, default=100000, help="Number of listings to seed.")
+        parser.add_argument("--repeat", type=int, default=5, help="Number of times each search is run.")
+
+    def handle(self, *args, **options):
+        databases = setup_databases(verbosity=0, interactive=False)
+        try:
+            self.seed(options["listings"])
+            self.compare(options["repeat"])
+        finally:
+            teardown_databases(databases, verbosity=0)
+
+    def seed(self, count):
+        owner = User.objects.create_user("benchmark", "benchmark@example.com", "password")
+        categories = list(Category.objects.all())
+
+        batch = []
+        for i in range(count):
+            price = Decimal(random.randint(100, 100000)) / 100
+            batch.append(AuctionListing(
+                user_ID=owner,
+                title=" ".join(words(4)).capitalize(),
+                description=" ".join(words(300))[:2000],
+                current_price=price,
+                starting_price=price,
+                image_URL="https://example.com/item.png",
+                category=random.choice(categories),
+                status="CLOSED" if i % 4 == 0 else "ACTIVE",
+            ))
+            if len(batch) == 1000:
+                AuctionListing.objects.bulk_create(batch)
+                batch = []
+        AuctionListing.objects.bulk_create(batch)
+
+    # Runs search() a number of times and returns the median time in milliseconds.
+    def time(self, search, repeat):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            search()
+            times.append(time.perf_counter() - start)
+        return statistics.median(times) * 1000
+
+    def compare(self, repeat):
+        self.stdout.write(f"{'search':<22} {'fts ms':>9} {'icontains ms':>13}")
+        for text in SEARCHES:
+            fts = self.time(lambda: search_listings(text), repeat)
+
+            # The same search done with icontains: every word must appear in the title or the description.
+            condition = Q(status="ACTIVE")
+            for term in text.split():
+                condition &= Q(title__icontains=term) | Q(description__icontains=term)
+            icontains = self.time(lambda: list(AuctionListing.objects.filter(condition).order_by("id")[:21]), repeat)
+
+            self.stdout.write(f"{text:<22} {fts:>9.2f} {icontains:>13.2f}")
@@ -0,0 +1,139 @@
+# Compares serving the app through WSGI (gunicorn) and ASGI (uvicorn) with many slow clients at once.
+#
+# Both servers are started against the same freshly seeded database in a temporary directory. A load generator then
+# opens --concurrency connections at once. Each one is a slow client: it sends the start of its request, waits
+# --client-delay seconds and only then sends the rest. A WSGI worker thread is held for the whole time it takes a
+# client to send its request and read the response, while the ASGI server's event loop handles waiting clients
+# without a thread each. The command prints how many requests per second each server completed, how many failed
+# or timed out, and the request latencies.
+#
+# Needs gunicorn and uvicorn to be installed.
+# Usage: python manage.py benchmark_servers --concurrency 1000 --seconds 15 --path /
+
+import asyncio
+import multiprocessing
+import os
+import resource
+import shutil
+import socket
+import statistics
+import subprocess
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from auctions.management.benchmarks import seed_database
+
+
+# Waits until something is accepting connections on the port, or raises CommandError.
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError(f"The server on port {port} didn't start.")
+
+
+# One slow client: sends requests one after another until the deadline, recording the latency of each one that
+# succeeds and counting the ones that fail.
+async def slow_client(port, path, delay, timeout, deadline, latencies, errors):
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        writer = None
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection("127.0.0.1", port), timeout)
+            writer.write(f"GET {path} HTTP/1.1\r\n".encode())
+            await writer.drain()
+            await asyncio.sleep(delay)
+            writer.write(b"Host: localhost\r\nConnection: close\r\n\r\n")
+            await writer.drain()
+            status = await asyncio.wait_for(reader.readline(), timeout)
+            await asyncio.wait_for(reader.read(), timeout)
+            if b" 200 " not in status:
+                raise ValueError(status)
+            latencies.append(time.perf_counter() - start)
+        except (OSError, asyncio.TimeoutError, ValueError):
+            errors.append(1)
+        finally:
+            if writer is not None:
+                writer.close()
+
+
+# Runs the load generator against a port and returns the latencies and the number of errors.
+async def generate_load(port, path, concurrency, seconds, delay, timeout):
+    latencies = []
+    errors = []
+    deadline = time.monotonic() + seconds
+    await asyncio.gather(*[
+        slow_client(port, path, delay, timeout, deadline, latencies, errors) for _ in range(concurrency)
+    ])
+    return latencies, len(errors)
+
+
+class Command(BaseCommand):
+    help = "Compares WSGI (gunicorn) and ASGI (uvicorn) throughput with many concurrent slow clients."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=1000, help="Number of clients at once.")
+        parser.add_argument("--seconds", type=float, default=15, help="How long each server is run for.")
+        parser.add_argument("--client-delay", type=float, default=1, help="Seconds each client takes to send.")
+        parser.add_argument("--timeout", type=float, default=30, help="Seconds before a request counts as failed.")
+        parser.add_argument("--workers", type=int, default=1, help="Server worker processes.")
+        parser.add_argument("--threads", type=int, default=8, help="Threads per WSGI worker.")
+        parser.add_argument("--path", default="/", help="The page to request.")
+        parser.add_argument("--port", type=int, default=8765)
+
+    def handle(self, *args, **options):
+        for program in ("gunicorn", "uvicorn"):
+            if shutil.which(program) is None:
+                raise CommandError(f"{program} isn't installed.")
+
+        # Every client needs a file descriptor, so allow as many as the system lets us.
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+        port = options["port"]
+        servers = {
+            "wsgi": [
+                "gunicorn", "commerce.wsgi:application", "--bind", f"127.0.0.1:{port}",
+                "--workers", str(options["workers"]), "--threads", str(options["threads"]),
+                "--worker-class", "gthread", "--log-level", "warning",
+            ],
+            "asgi": [
+                "uvicorn", "commerce.asgi:application", "--port", str(port),
+                "--workers", str(options["workers"]), "--log-level", "warning",
+            ],
+        }
+
+        with tempfile.TemporaryDirectory() as directory:
+            env = {"SQLITE_PATH": os.path.join(directory, "benchmark.sqlite3")}
+            seed = multiprocessing.get_context("spawn").Process(target=seed_database, args=(env, 1, 200))
+            seed.start()
+            seed.join()
+
+            self.stdout.write(f"{'server':<8} {'req/s':>8} {'errors':>7} {'p50 ms':>9} {'p99 ms':>9}")
+            for name, command in servers.items():
+                server = subprocess.Popen(
+                    command, cwd=settings.BASE_DIR, env={**os.environ, **env}, stdout=subprocess.DEVNULL
+                )
+                try:
+                    wait_for_port(port)
+                    latencies, errors = asyncio.run(generate_load(
+                        port, options["path"], options["concurrency"], options["seconds"],
+                        options["client_delay"], options["timeout"],
+                    ))
+                finally:
+                    server.terminate()
+                    server.wait()
+
+                latencies.sort()
+                p50 = statistics.median(latencies) * 1000 if latencies else 0
+                p99 = latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0
+                self.stdout.write(
+                    f"{name:<8} {len(latencies) / options['seconds']:>8.1f} {errors:>7} {p50:>9.1f} {p99:>9.1f}"
+                )
@@ -0,0 +1,110 @@
+# Compares the default SQLite setup with the production profile (SQLITE_PRODUCTION=1) under several processes.
+#
+# For each setup, a fresh database file is migrated and seeded in a temporary directory, then a number of worker
+# processes send a mix of page views and bids/comments to the app for a fixed time. The command prints how many
+# requests per second were served, how many failed (e.g. "database is locked") and the request latencies.
+#
+# Usage: python manage.py benchmark_sqlite --processes 8 --seconds 10
+
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from auctions.management.benchmarks import setup_django, seed_database
+
+
+# Sends requests to the app until the time is up, and puts the worker's results on the queue.
+def _work(env, number, seconds, write_ratio, listings, results):
+    setup_django(env)
+
+    from django.test import Client
+    from auctions.models import User
+
+    client = Client(HTTP_HOST="localhost")
+    client.force_login(User.objects.get(username=f"bench{number}"))
+
+    latencies = []
+    errors = 0
+    amount = Decimal(number)
+    deadline = time.monotonic() + seconds
+
+    while time.monotonic() < deadline:
+        listing_id = random.randint(1, listings)
+        start = time.perf_counter()
+        try:
+            if random.random() < write_ratio:
+                if random.random() < 0.5:
+                    amount += 10
+                    response = client.post(f"/{listing_id}/bid", {"bid": str(amount)})
+                else:
+                    response = client.post(f"/{listing_id}/comment", {"textarea": "Benchmark comment."})
+            elif random.random() < 0.5:
+                response = client.get("/")
+            else:
+                response = client.get(f"/{listing_id}/get_listing")
+            if response.status_code >= 400:
+                errors += 1
+                continue
+        except Exception:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - start)
+
+    results.put((latencies, errors))
+
+
+class Command(BaseCommand):
+    help = "Compares request throughput of the default and production SQLite setups with several processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=4, help="Number of worker processes.")
+        parser.add_argument("--seconds", type=float, default=10, help="How long each setup is run for.")
+        parser.add_argument("--writes", type=float, default=0.2, help="Fraction of requests that bid or comment.")
+        parser.add_argument("--listings", type=int, default=200, help="Number of listings to seed.")
+
+    def handle(self, *args, **options):
+        # Worker processes are started fresh, so each one sets up Django with its own settings.
+        context = multiprocessing.get_context("spawn")
+
+        self.stdout.write(f"{'setup':<12} {'req/s':>8} {'errors':>7} {'p50 ms':>8} {'p99 ms':>8}")
+        for name, production in (("default", "0"), ("production", "1")):
+            with tempfile.TemporaryDirectory() as directory:
+                env = {
+                    "SQLITE_PATH": os.path.join(directory, "benchmark.sqlite3"),
+                    "SQLITE_PRODUCTION": production,
+                }
+
+                seed = context.Process(target=seed_database, args=(env, options["processes"] + 1, options["listings"]))
+                seed.start()
+                seed.join()
+
+                results = context.Queue()
+                workers = [
+                    context.Process(target=_work, args=(
+                        env, number, options["seconds"], options["writes"], options["listings"], results
+                    ))
+                    for number in range(options["processes"])
+                ]
+                for worker in workers:
+                    worker.start()
+                latencies = []
+                errors = 0
+                for _ in workers:
+                    worker_latencies, worker_errors = results.get()
+                    latencies += worker_latencies
+                    errors += worker_errors
+                for worker in workers:
+                    worker.join()
+
+            latencies.sort()
+            p50 = statistics.median(latencies) * 1000 if latencies else 0
+            p99 = latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0
+            self.stdout.write(
+                f"{name:<12} {len(latencies) / options['seconds']:>8.1f} {errors:>7} {p50:>8.1f} {p99:>8.1f}"
+            )
@@ -0,0 +1,98 @@
+# Times rendering listing.html for a listing with many comments, so that changes to the listing templates that make
+# them slower show up as numbers.
+#
+# A listing and its comments are seeded into a throwaway test database (the real database isn't touched) and the
+# page's context is built once with views.listing_context(), with every comment on one page. The page is then
+# rendered a number of times by two copies of the project's template backend: one that reads and compiles the
+# templates for every render (as with DEBUG on) and one with the cached loader (as in production). The median time
+# of each is printed, along with the time for the cached backend to render just the comments.
+#
+# Usage: python manage.py benchmark_templates --comments 500
+
+import statistics
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.test.utils import setup_databases, teardown_databases
+
+from auctions import views
+from auctions.models import User, Category, AuctionListing, ListingComment
+from auctions.profiling import ProfiledTemplates
+
+
+# The loaders that find the project's templates, without the cached loader.
+LOADERS = ["django.template.loaders.filesystem.Loader", "django.template.loaders.app_directories.Loader"]
+
+
+class Command(BaseCommand):
+    help = "Times rendering a listing page with many comments, with and without cached templates."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--comments", type=int, default=500, help="Number of comments on the listing.")
+        parser.add_argument("--repeat", type=int, default=50, help="Number of times the page is rendered.")
+
+    def handle(self, *args, **options):
+        databases = setup_databases(verbosity=0, interactive=False)
+        try:
+            request, context = self.seed(options["comments"])
+            self.compare(request, context, options["repeat"])
+        finally:
+            teardown_databases(databases, verbosity=0)
+
+    # Seeds a listing with comments from a few users, and returns a request from one of them and the context of the
+    # listing's page.
+    def seed(self, count):
+        users = [User.objects.create_user(f"user{i}", f"user{i}@example.com", "password") for i in range(10)]
+        listing = AuctionListing.objects.create(
+            user_ID=users[0],
+            title="A listing with many comments",
+            description="The listing whose page is rendered.",
+            current_price=Decimal("10.00"),
+            image_URL="https://example.com/item.png",
+            category=Category.objects.first(),
+        )
+        ListingComment.objects.bulk_create([
+            ListingComment(user_ID=users[i % len(users)], listing=listing, comment=f"Comment number {i}. " * 5)
+            for i in range(count)
+        ])
+
+        request = RequestFactory().get(f"/{listing.id}")
+        request.user = users[1]
+        context = views.listing_context(request, listing.id)
+        # Every comment on one page, read now so only rendering is timed.
+        context["comments"] = list(ListingComment.objects.filter(listing=listing).select_related("user_ID"))
+        context["comments_cursor"] = None
+        views.watched_ids(request)
+        return request, context
+
+    # Renders a template a number of times and returns the median time in milliseconds.
+    def time(self, backend, name, context, request, repeat):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            backend.get_template(name).render(context, request)
+            times.append(time.perf_counter() - start)
+        return statistics.median(times) * 1000
+
+    # A copy of the project's template backend, with the given loaders.
+    def backend(self, loaders):
+        options = dict(settings.TEMPLATES[0]["OPTIONS"], loaders=loaders)
+        return ProfiledTemplates({"NAME": "benchmark", "DIRS": [], "APP_DIRS": False, "OPTIONS": options})
+
+    def compare(self, request, context, repeat):
+        uncached = self.backend(LOADERS)
+        cached = self.backend([("django.template.loaders.cached.Loader", LOADERS)])
+
+        comments = len(context["comments"])
+        self.stdout.write(f"{'render':<34} {'ms':>8}")
+        for label, backend, name in [
+            ("listing.html, compiled each time", uncached, "auctions/listing.html"),
+            ("listing.html, cached", cached, "auctions/listing.html"),
+            ("listing/comments.html, cached", cached, "auctions/listing/comments.html"),
+        ]:
+            elapsed = self.time(backend, name, context, request, repeat)
+            self.stdout.write(f"{label:<34} {elapsed:>8.2f}")
+        self.stdout.write(f"({comments} comments, median of {repeat} renders)")
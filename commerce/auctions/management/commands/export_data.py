@@ -0,0 +1,37 @@
+# Exports every listing, bid or comment to a CSV or JSON Lines file (see auctions/transfer.py), reading the table a
+# chunk at a time.
+#
+# Usage: python manage.py export_data listings listings.csv
+#        python manage.py export_data bids - --format jsonl > bids.jsonl
+
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from auctions.transfer import BATCH_SIZE, FORMATS, MODELS, TransferError, export_chunks, format_of
+
+
+class Command(BaseCommand):
+    help = "Exports listings, bids or comments to a CSV or JSON Lines file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("model", choices=list(MODELS), help="What to export.")
+        parser.add_argument("path", help="The file to write, or - to write to standard output.")
+        parser.add_argument("--format", choices=FORMATS, help="The file's format, if its name doesn't end in one.")
+        parser.add_argument("--chunk-size", type=int, default=BATCH_SIZE, help="Rows read from the database at once.")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+
+        try:
+            format = format_of(path, options["format"])
+            stream = sys.stdout if path == "-" else open(path, "w", newline="", encoding="utf-8")
+        except (OSError, TransferError) as error:
+            raise CommandError(error)
+
+        try:
+            for chunk in export_chunks(MODELS[options["model"]], format, options["chunk_size"]):
+                stream.write(chunk)
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
@@ -0,0 +1,47 @@
+# Imports listings, bids or comments from a CSV or JSON Lines file (see auctions/transfer.py), streaming the file in
+# batches. Import listings first, then bids, then comments; the users they refer to must already exist.
+#
+# Usage: python manage.py import_data listings listings.csv
+#        python manage.py import_data bids - --format jsonl < bids.jsonl
+
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from auctions.transfer import (
+    BATCH_SIZE, FORMATS, MODELS, TransferError, finish_import, format_of, import_rows, read_rows
+)
+
+
+class Command(BaseCommand):
+    help = "Imports listings, bids or comments from a CSV or JSON Lines file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("model", choices=list(MODELS), help="What the file contains.")
+        parser.add_argument("path", help="The file to import, or - to read standard input.")
+        parser.add_argument("--format", choices=FORMATS, help="The file's format, if its name doesn't end in one.")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Rows saved per INSERT.")
+
+    def handle(self, *args, **options):
+        model = MODELS[options["model"]]
+        path = options["path"]
+
+        try:
+            format = format_of(path, options["format"])
+            stream = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+        except (OSError, TransferError) as error:
+            raise CommandError(error)
+
+        try:
+            count = import_rows(model, read_rows(stream, format), options["batch_size"])
+        except (ValueError, IntegrityError) as error:
+            # A bad row, a line that isn't JSON or a batch that refers to a missing row. The batches before it are kept.
+            raise CommandError(error)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            # Bring whatever depends on the saved rows up to date, even if the import stopped part way.
+            finish_import(model)
+
+        self.stdout.write(f"Imported {count} {options['model']}.")
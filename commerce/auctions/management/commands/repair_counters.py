@@ -0,0 +1,24 @@
+# Sets the counts stored for listings and categories from the rows they count, in case they have drifted (e.g. after
+# rows were deleted in the admin or with SQL): each listing's bid, comment and watcher counts (see counters.py) and
+# each category's active listing count. Both are fixed in batches, with set-based queries.
+#
+# Usage: python manage.py repair_counters
+
+from django.core.management.base import BaseCommand
+
+from auctions.bidding import recount_categories
+from auctions.counters import recount_listings, update_in_batches
+from auctions.models import Category
+
+
+class Command(BaseCommand):
+    help = "Recounts the bid, comment and watcher counts of listings and the active counts of categories."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000, help="Listings checked per transaction.")
+
+    def handle(self, *args, **options):
+        fixed = recount_listings(batch_size=options["batch_size"])
+        update_in_batches(Category, recount_categories, options["batch_size"])
+
+        self.stdout.write(f"Fixed the counts of {fixed} listings.")
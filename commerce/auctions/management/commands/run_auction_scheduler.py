@@ -0,0 +1,86 @@
+# Closes listings when their auctions end.
+#
+# Runs until it's stopped. Each time it wakes up, it closes every listing whose auction has ended, in batches (see
+# bidding.close_expired), then sleeps until the next auction ends. Listings can be given an end time while it sleeps
+# (in the admin, or by import_data) that comes before the one it is waiting for, so it never sleeps for longer than
+# --max-sleep (a minute by default) and such a listing closes at most that late. When thousands of auctions end in
+# the same minute, it wakes once and closes them a batch at a time.
+#
+# Separately, every --prune-interval seconds, it deletes the leaderboards' activity buckets that have dropped out of
+# the last hour (see leaderboards.py), waking up for that if no auction ends sooner.
+#
+# Usage: python manage.py run_auction_scheduler
+#        python manage.py run_auction_scheduler --once    (close what has ended and exit, e.g. from cron)
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections
+from django.utils import timezone
+
+from auctions.bidding import close_expired, next_deadline
+from auctions.leaderboards import WINDOW, prune_activity
+
+
+# The longest the scheduler sleeps by default, in seconds, and so how late a listing given an earlier end time
+# while it sleeps can be closed.
+MAX_SLEEP = 60
+
+
+class Command(BaseCommand):
+    help = "Closes listings whose auctions have ended, waking up when the next auction ends."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Listings closed per transaction.")
+        parser.add_argument("--max-sleep", type=float, default=MAX_SLEEP,
+                            help="Longest time to sleep, in seconds.")
+        parser.add_argument("--prune-interval", type=float, default=WINDOW.total_seconds(),
+                            help="Seconds between deleting old leaderboard activity.")
+        parser.add_argument("--once", action="store_true", help="Close the listings that have ended and exit.")
+
+    def handle(self, *args, **options):
+        next_prune = time.monotonic()
+        try:
+            while True:
+                try:
+                    self.close_ended(options["batch_size"])
+                    if time.monotonic() >= next_prune:
+                        prune_activity(timezone.now())
+                        next_prune = time.monotonic() + options["prune_interval"]
+                except OperationalError as error:
+                    # The database was busy (e.g. locked by other writers for longer than the busy timeout).
+                    # Nothing was half-done, so try again shortly.
+                    self.stderr.write(f"Couldn't close listings, retrying: {error}")
+                    time.sleep(1)
+                    continue
+
+                if options["once"]:
+                    return
+
+                until_prune = max(0, next_prune - time.monotonic())
+                time.sleep(min(self.seconds_to_sleep(options["max_sleep"]), until_prune))
+                # Drop the database connection if it has gone bad or is past CONN_MAX_AGE while we slept.
+                close_old_connections()
+        except KeyboardInterrupt:
+            pass
+
+    # Closes every listing that has ended by now, a batch at a time.
+    def close_ended(self, batch_size):
+        now = timezone.now()
+        total = 0
+        while True:
+            closed = close_expired(now, batch_size)
+            total += closed
+            if closed < batch_size:
+                break
+
+        if total:
+            self.stdout.write(f"{now:%Y-%m-%d %H:%M:%S} closed {total} listings")
+
+    # Returns how long to sleep for: until the next auction ends, but no longer than max_sleep.
+    def seconds_to_sleep(self, max_sleep):
+        deadline = next_deadline()
+        if deadline is None:
+            return max_sleep
+
+        return min(max(0, (deadline - timezone.now()).total_seconds()), max_sleep)
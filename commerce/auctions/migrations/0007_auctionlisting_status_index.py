@@ -0,0 +1,18 @@
+# Generated by Django 3.1.14 on 2026-10-18 20:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0006_delete_category'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='auctionlisting',
+            name='status',
+            field=models.CharField(db_index=True, default='ACTIVE', max_length=10),
+        ),
+    ]
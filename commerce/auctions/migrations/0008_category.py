@@ -0,0 +1,90 @@
+# Generated by Django 3.1.14 on 2026-10-18 20:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# The categories a user could choose from before categories had their own table.
+CATEGORIES = [
+    "Food",
+    "Home Appliances",
+    "Health",
+    "Tools",
+    "Books",
+    "Entertainment",
+    "Clothing",
+    "Sporting Goods",
+]
+
+
+# Creates a Category row for every known category (and any other name already used by a listing),
+# points each listing at its row, and fills in the active listing counts.
+def forwards(apps, schema_editor):
+    Category = apps.get_model("auctions", "Category")
+    AuctionListing = apps.get_model("auctions", "AuctionListing")
+
+    names = list(CATEGORIES)
+    for name in AuctionListing.objects.values_list("category_name", flat=True).distinct():
+        if name not in names:
+            names.append(name)
+
+    for name in names:
+        category = Category.objects.create(name=name)
+        AuctionListing.objects.filter(category_name=name).update(category=category)
+        category.active_count = AuctionListing.objects.filter(category=category, status="ACTIVE").count()
+        category.save(update_fields=["active_count"])
+
+
+# Copies category names back onto the listings.
+def backwards(apps, schema_editor):
+    Category = apps.get_model("auctions", "Category")
+    AuctionListing = apps.get_model("auctions", "AuctionListing")
+
+    for category in Category.objects.all():
+        AuctionListing.objects.filter(category=category).update(category_name=category.name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0007_auctionlisting_status_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Category',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=20, unique=True)),
+                ('active_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'categories',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.RenameField(
+            model_name='auctionlisting',
+            old_name='category',
+            new_name='category_name',
+        ),
+        migrations.AddField(
+            model_name='auctionlisting',
+            name='category',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='listings', to='auctions.category'),
+        ),
+        migrations.RunPython(forwards, backwards),
+        migrations.RemoveField(
+            model_name='auctionlisting',
+            name='category_name',
+        ),
+        migrations.AlterField(
+            model_name='auctionlisting',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='listings', to='auctions.category'),
+        ),
+        migrations.AddIndex(
+            model_name='auctionlisting',
+            index=models.Index(fields=['category', 'status'], name='listing_category_status_idx'),
+        ),
+    ]
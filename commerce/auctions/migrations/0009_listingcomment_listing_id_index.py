@@ -0,0 +1,17 @@
+# Generated by Django 3.1.14 on 2026-10-18 20:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0008_category'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='listingcomment',
+            index=models.Index(fields=['listing', 'id'], name='comment_listing_id_idx'),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 3.1.14 on 2026-10-18 20:14
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Points each listing at its highest bid (the earliest one, if there is a tie) and turns the winner's
+# username into a reference to their user.
+def forwards(apps, schema_editor):
+    AuctionListing = apps.get_model("auctions", "AuctionListing")
+    Bid = apps.get_model("auctions", "Bid")
+    User = apps.get_model("auctions", "User")
+
+    for listing in AuctionListing.objects.all():
+        leading_bid = Bid.objects.filter(listing=listing).order_by("-amount_bid", "id").first()
+        if leading_bid is not None:
+            listing.leading_bid = leading_bid
+            listing.leading_bidder_id = leading_bid.user_ID_id
+        listing.winner = User.objects.filter(username=listing.winner_name).first()
+        listing.save(update_fields=["leading_bid", "leading_bidder", "winner"])
+
+
+# Turns the winner back into a username.
+def backwards(apps, schema_editor):
+    AuctionListing = apps.get_model("auctions", "AuctionListing")
+
+    for listing in AuctionListing.objects.exclude(winner=None).select_related("winner"):
+        listing.winner_name = listing.winner.username
+        listing.save(update_fields=["winner_name"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0009_listingcomment_listing_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auctionlisting',
+            name='leading_bid',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='auctions.bid'),
+        ),
+        migrations.AddField(
+            model_name='auctionlisting',
+            name='leading_bidder',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RenameField(
+            model_name='auctionlisting',
+            old_name='winner',
+            new_name='winner_name',
+        ),
+        migrations.AddField(
+            model_name='auctionlisting',
+            name='winner',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='listings_won', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(forwards, backwards),
+        migrations.RemoveField(
+            model_name='auctionlisting',
+            name='winner_name',
+        ),
+    ]
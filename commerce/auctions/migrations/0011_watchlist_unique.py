@@ -0,0 +1,31 @@
+# Generated by Django 3.1.14 on 2026-10-18 20:15
+
+from django.db import migrations, models
+
+
+# Deletes duplicate watchlist rows, keeping the first one, so the unique constraint can be added.
+def remove_duplicates(apps, schema_editor):
+    WatchList = apps.get_model("auctions", "WatchList")
+
+    seen = set()
+    for row in WatchList.objects.order_by("id"):
+        key = (row.user_ID_id, row.single_listing_watched_id)
+        if key in seen:
+            row.delete()
+        else:
+            seen.add(key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0010_leading_bid'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='watchlist',
+            constraint=models.UniqueConstraint(fields=('user_ID', 'single_listing_watched'), name='unique_watched_listing'),
+        ),
+    ]
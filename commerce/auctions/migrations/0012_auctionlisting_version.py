@@ -0,0 +1,18 @@
+# Generated by Django 3.1.14 on 2026-10-18 20:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0011_watchlist_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auctionlisting',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
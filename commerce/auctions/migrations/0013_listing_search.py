@@ -0,0 +1,64 @@
+# Generated by Django 3.1.14 on 2026-10-18 20:31
+
+from django.db import migrations
+
+
+# A full-text index over listing titles and descriptions, using SQLite's FTS5. It is an "external content" table:
+# the text itself stays in auctions_auctionlisting and triggers keep the index in step with every insert, update and
+# delete, however the listing is changed.
+CREATE = [
+    """
+    CREATE VIRTUAL TABLE auctions_listing_search USING fts5(
+        title, description, content='auctions_auctionlisting', content_rowid='id', tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER auctions_listing_search_insert AFTER INSERT ON auctions_auctionlisting BEGIN
+        INSERT INTO auctions_listing_search(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER auctions_listing_search_delete AFTER DELETE ON auctions_auctionlisting BEGIN
+        INSERT INTO auctions_listing_search(auctions_listing_search, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER auctions_listing_search_update AFTER UPDATE OF title, description ON auctions_auctionlisting BEGIN
+        INSERT INTO auctions_listing_search(auctions_listing_search, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO auctions_listing_search(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+    # Index the listings that already exist.
+    "INSERT INTO auctions_listing_search(auctions_listing_search) VALUES ('rebuild')",
+]
+
+DROP = [
+    "DROP TRIGGER IF EXISTS auctions_listing_search_update",
+    "DROP TRIGGER IF EXISTS auctions_listing_search_delete",
+    "DROP TRIGGER IF EXISTS auctions_listing_search_insert",
+    "DROP TABLE IF EXISTS auctions_listing_search",
+]
+
+
+# The search index only exists on SQLite.
+def run(statements):
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor != "sqlite":
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0012_auctionlisting_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE), run(DROP)),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.1.14 on 2026-10-18 20:33
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+
+# Adding a column on SQLite rebuilds auctions_auctionlisting, which drops the triggers that keep the search index
+# (migration 0013) in step with it, so the index is set up again afterwards (and again after undoing this migration).
+search = import_module("auctions.migrations.0013_listing_search")
+rebuild_search = search.run(search.DROP + search.CREATE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0013_listing_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, rebuild_search),
+        migrations.AddField(
+            model_name='auctionlisting',
+            name='ends_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='auctionlisting',
+            index=models.Index(fields=['status', 'ends_at'], name='listing_status_ends_at_idx'),
+        ),
+        migrations.RunPython(rebuild_search, migrations.RunPython.noop),
+    ]
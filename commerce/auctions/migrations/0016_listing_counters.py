@@ -0,0 +1,56 @@
+# Generated by Django 3.1.14 on 2026-10-18 20:43
+
+from importlib import import_module
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+# Adding columns rebuilds the listings table on SQLite, dropping the search index's triggers (see 0014).
+rebuild_search = import_module("auctions.migrations.0014_auctionlisting_ends_at").rebuild_search
+
+
+# Counts the bids, comments and watchers every existing listing has.
+def count(apps, schema_editor):
+    AuctionListing = apps.get_model("auctions", "AuctionListing")
+    counters = {
+        "bid_count": (apps.get_model("auctions", "Bid"), "listing"),
+        "comment_count": (apps.get_model("auctions", "ListingComment"), "listing"),
+        "watcher_count": (apps.get_model("auctions", "WatchList"), "single_listing_watched"),
+    }
+
+    counts = {}
+    for name, (model, field) in counters.items():
+        rows = model.objects.filter(**{field: OuterRef("id")}).order_by().values(field)
+        counts[name] = Coalesce(Subquery(rows.annotate(count=Count("id")).values("count")), 0)
+
+    AuctionListing.objects.update(**counts)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0015_auctionlisting_image'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, rebuild_search),
+        migrations.AddField(
+            model_name='auctionlisting',
+            name='bid_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='auctionlisting',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='auctionlisting',
+            name='watcher_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(rebuild_search, migrations.RunPython.noop),
+        migrations.RunPython(count, migrations.RunPython.noop),
+    ]
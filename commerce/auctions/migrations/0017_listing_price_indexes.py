@@ -0,0 +1,35 @@
+# Generated by Django 3.1.14 on 2026-10-18 20:53
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+
+# Altering a column rebuilds the listings table on SQLite, dropping the search index's triggers (see 0014).
+rebuild_search = import_module("auctions.migrations.0014_auctionlisting_ends_at").rebuild_search
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0016_listing_counters'),
+    ]
+
+    operations = [
+        # The status index from 0007 is a prefix of the (status, ...) indexes, so it only adds to the cost of writes.
+        migrations.RunPython(migrations.RunPython.noop, rebuild_search),
+        migrations.AlterField(
+            model_name='auctionlisting',
+            name='status',
+            field=models.CharField(default='ACTIVE', max_length=10),
+        ),
+        migrations.RunPython(rebuild_search, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='auctionlisting',
+            index=models.Index(fields=['status', 'current_price'], name='listing_status_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auctionlisting',
+            index=models.Index(fields=['status', 'category', 'current_price'], name='listing_status_cat_price_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 3.1.14 on 2026-10-18 21:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0017_listing_price_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingActivity',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('bids', models.PositiveIntegerField(default=0)),
+                ('price_rise', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+            ],
+            options={
+                'verbose_name_plural': 'listing activity',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='auctionlisting',
+            index=models.Index(fields=['status', 'watcher_count'], name='listing_status_watchers_idx'),
+        ),
+        migrations.AddField(
+            model_name='listingactivity',
+            name='listing',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity', to='auctions.auctionlisting'),
+        ),
+        migrations.AddIndex(
+            model_name='listingactivity',
+            index=models.Index(fields=['bucket'], name='activity_bucket_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='listingactivity',
+            constraint=models.UniqueConstraint(fields=('listing', 'bucket'), name='unique_listing_activity_bucket'),
+        ),
+    ]
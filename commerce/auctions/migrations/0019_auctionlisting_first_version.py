@@ -0,0 +1,32 @@
+# Generated by Django 3.1.14 on 2026-10-18 21:31
+
+import random
+from importlib import import_module
+
+from django.db import migrations, models
+
+
+# Altering a column rebuilds the listings table on SQLite, dropping the search index's triggers (see 0014).
+rebuild_search = import_module("auctions.migrations.0014_auctionlisting_ends_at").rebuild_search
+
+
+# The random version new listings started at until 0021. Kept here, since the model no longer uses it.
+def first_version():
+    return random.randint(1, 2 ** 30)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0018_listing_activity'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, rebuild_search),
+        migrations.AlterField(
+            model_name='auctionlisting',
+            name='version',
+            field=models.PositiveIntegerField(default=first_version),
+        ),
+        migrations.RunPython(rebuild_search, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.1.14 on 2026-10-18 23:05
+
+from importlib import import_module
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+# Adding a column rebuilds the listings table on SQLite, dropping the search index's triggers (see 0014).
+rebuild_search = import_module("auctions.migrations.0014_auctionlisting_ends_at").rebuild_search
+
+
+# Starts every existing listing at its current price. That's exact for listings nobody has bid on; a listing that has
+# bids already has a leading bid, which its next bid is measured against instead.
+def set_starting_price(apps, schema_editor):
+    AuctionListing = apps.get_model("auctions", "AuctionListing")
+    AuctionListing.objects.update(starting_price=F("current_price"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0019_auctionlisting_first_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, rebuild_search),
+        migrations.AddField(
+            model_name='auctionlisting',
+            name='starting_price',
+            field=models.DecimalField(blank=True, decimal_places=2, default=0, max_digits=8),
+            preserve_default=False,
+        ),
+        migrations.RunPython(rebuild_search, migrations.RunPython.noop),
+        migrations.RunPython(set_starting_price, migrations.RunPython.noop),
+    ]
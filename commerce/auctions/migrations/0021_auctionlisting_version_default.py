@@ -0,0 +1,26 @@
+# Generated by Django 3.1.14 on 2026-10-18 23:40
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+
+# Altering a column rebuilds the listings table on SQLite, dropping the search index's triggers (see 0014).
+rebuild_search = import_module("auctions.migrations.0014_auctionlisting_ends_at").rebuild_search
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0020_auctionlisting_starting_price'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, rebuild_search),
+        migrations.AlterField(
+            model_name='auctionlisting',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.RunPython(rebuild_search, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,11 @@
 # Our database tables.
 
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
+from .images import thumbnail_name
+
 # Default primary key (ID) is provided by Django for each model created.
 # Each class variable is a column in our table.
 
@@ -16,8 +19,34 @@ class User(AbstractUser):
     password = models.CharField(max_length=30)
     # Email address.
     email = models.EmailField()
+
+    # The hash of the password that the user's sessions are checked against. A user rebuilt from the cache (see
+    # backends.py) doesn't have their password loaded, only this hash.
+    def get_session_auth_hash(self):
+        if "password" not in self.__dict__ and hasattr(self, "_session_auth_hash"):
+            return self._session_auth_hash
+        return super().get_session_auth_hash()
     
 
+# A table for listing categories.
+class Category(models.Model):
+    # Primary Key ID.
+
+    # Name of the category, e.g. "Food".
+    name = models.CharField(max_length=20, unique=True)
+    # Number of active listings in this category. It goes up or down by one when a listing is created, closed, deleted
+    # or moved (see bidding.py), so the categories page can show it without counting the listings table on every
+    # request.
+    active_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["id"]
+        verbose_name_plural = "categories"
+
+    def __str__(self):
+        return self.name
+
+
 # A table for auction listings.
 class AuctionListing(models.Model):
     # Primary Key ID.
@@ -34,14 +63,80 @@ class AuctionListing(models.Model):
     description = models.CharField(max_length=2000)
     # Current Price.
     current_price = models.DecimalField(max_digits=8, decimal_places=2)
-    # Image URL.
+    # The price the listing started at, before any bids. It is set from the current price when the listing is created,
+    # and lets the leaderboards count how much a listing's first bid raised its price.
+    starting_price = models.DecimalField(max_digits=8, decimal_places=2, blank=True)
+    # Image URL. For an uploaded image, this is the URL of the image itself (see images.py).
     image_URL = models.CharField(max_length=300)
+    # The hash of an uploaded image, set once its thumbnails are ready.
+    image = models.CharField(max_length=32, blank=True)
     # Status of listing (whether or not someone has won the bid--open or closed).
+    # Active listings are filtered in the database instead of in Python, with the (status, ...) indexes below, which
+    # each start with it. A separate index on status would only add to the cost of every write.
     status = models.CharField(max_length=10, default="ACTIVE")
-    # Category.
-    category = models.CharField(max_length=20, default="TBD")
-    # The winner of a bid.
-    winner = models.CharField(max_length=300, default="TBD")
+    # Category (Foreign Key from Category).
+    # (on_delete=models.PROTECT stops a category from being deleted while listings still belong to it.)
+    category = models.ForeignKey(Category, on_delete=models.PROTECT, related_name="listings")
+    # The current leading bid and the user who made it (Foreign Keys), kept up to date as bids are placed
+    # so that closing a listing doesn't have to search its bids.
+    # (related_name="+" means a Bid or User doesn't get a reverse relation back to these listings.)
+    leading_bid = models.ForeignKey("Bid", on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    leading_bidder = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    # The winner of a bid (the leading bidder at the time the listing was closed).
+    winner = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="listings_won")
+    # Goes up by one every time the listing changes (a new bid, closing it or editing it). Rendered copies of the
+    # listing's card are cached under this number, so a change means the old copy is simply no longer used.
+    # A deleted listing's cached cards are deleted with it (see cards.py), so a new listing that ends up with its ID
+    # (rebuilding the table in a migration resets SQLite's ID sequence to the highest ID left) doesn't find them.
+    version = models.PositiveIntegerField(default=1)
+    # How many bids, comments and watchers the listing has, kept up to date as they are added and removed so that
+    # cards can show them without counting (see counters.py).
+    bid_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+    watcher_count = models.PositiveIntegerField(default=0)
+    # When the auction ends and the listing is closed automatically (see the run_auction_scheduler command).
+    # Listings without an end time stay open until their owner closes them.
+    ends_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Lets a category page find its active listings without scanning the table.
+            models.Index(fields=["category", "status"], name="listing_category_status_idx"),
+            # Lets the scheduler find the active listings that have ended, and the next one to end, in deadline order.
+            models.Index(fields=["status", "ends_at"], name="listing_status_ends_at_idx"),
+            # Lets the leaderboards find the most watched active listings without sorting them all.
+            models.Index(fields=["status", "watcher_count"], name="listing_status_watchers_idx"),
+            # Let the homepage and category pages find active listings in a price range and in price order, by
+            # walking the index instead of sorting every active listing.
+            models.Index(fields=["status", "current_price"], name="listing_status_price_idx"),
+            models.Index(fields=["status", "category", "current_price"], name="listing_status_cat_price_idx"),
+        ]
+
+    # The URLs of the listing's image at the thumbnail sizes, for cards and listing pages. These are image_URL for a
+    # linked image, or for an uploaded one until its thumbnails are ready.
+    @property
+    def small_image_URL(self):
+        return self.thumbnail_URL("small")
+
+    @property
+    def medium_image_URL(self):
+        return self.thumbnail_URL("medium")
+
+    def thumbnail_URL(self, size):
+        if not self.image:
+            return self.image_URL
+        return settings.MEDIA_URL + thumbnail_name(self.image, size)
+
+    def save(self, *args, **kwargs):
+        # A new listing starts at its current price.
+        if self._state.adding and self.starting_price is None:
+            self.starting_price = self.current_price
+        # Saving a listing that is already in the table is an edit, so it gets a new version.
+        if self.pk is not None:
+            self.version += 1
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = list(kwargs["update_fields"]) + ["version"]
+        super().save(*args, **kwargs)
 
 
 # A table for listings a user is watching.
@@ -54,6 +149,12 @@ class WatchList(models.Model):
     # If the AuctionListing is deleted, delete this listing from the WatchList.
     single_listing_watched = models.ForeignKey(AuctionListing, on_delete=models.CASCADE, related_name="listings_watched")
 
+    class Meta:
+        constraints = [
+            # A user can only watch a listing once.
+            models.UniqueConstraint(fields=["user_ID", "single_listing_watched"], name="unique_watched_listing"),
+        ]
+
 
 # A table for item bids.
 class Bid(models.Model):
@@ -76,4 +177,37 @@ class ListingComment(models.Model):
     # Listing (Foreign Key).
     listing = models.ForeignKey(AuctionListing, on_delete=models.CASCADE)
     # Comment.
-    comment = models.CharField(max_length=300)
\ No newline at end of file
+    comment = models.CharField(max_length=300)
+
+    class Meta:
+        indexes = [
+            # Lets a listing page fetch its comments in order, one page at a time, without scanning the table.
+            models.Index(fields=["listing", "id"], name="comment_listing_id_idx"),
+        ]
+
+
+# A table of bidding activity per listing per few minutes (see leaderboards.py): how many bids a listing got and how
+# much they raised its price in each time bucket. Rows are added to as bids are placed, so the leaderboards can add
+# up an hour of activity from a few rows per listing instead of going through the bids.
+class ListingActivity(models.Model):
+    # Primary Key ID.
+
+    # Listing (Foreign Key).
+    listing = models.ForeignKey(AuctionListing, on_delete=models.CASCADE, related_name="activity")
+    # The start of the time bucket.
+    bucket = models.DateTimeField()
+    # The number of bids placed on the listing in the bucket.
+    bids = models.PositiveIntegerField(default=0)
+    # How much those bids raised the listing's price.
+    price_rise = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            # One row per listing per bucket, found directly when a bid is added to it.
+            models.UniqueConstraint(fields=["listing", "bucket"], name="unique_listing_activity_bucket"),
+        ]
+        indexes = [
+            # Lets the leaderboards read the last hour's buckets, and old buckets be deleted, without a full scan.
+            models.Index(fields=["bucket"], name="activity_bucket_idx"),
+        ]
+        verbose_name_plural = "listing activity"
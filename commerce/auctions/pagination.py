@@ -0,0 +1,87 @@
+# Keyset ("cursor") pagination helpers.
+#
+# Instead of using OFFSET, which makes the database walk past every skipped row, a page is fetched by
+# filtering on the values of the last row of the previous page. Those values are handed to the client
+# as an opaque "cursor" token that is passed back in the query string to get the next page.
+
+import base64
+import json
+
+from django.db.models import Q
+
+
+# The number of rows shown on a page unless a view asks for something else.
+PAGE_SIZE = 20
+
+
+# Turns the ordering values of a row into an opaque, URL-safe token.
+def encode_cursor(values):
+    raw = json.dumps([str(value) for value in values]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+# Turns a token made by encode_cursor() back into a list of values. A missing or tampered-with token
+# returns None, which we treat as "start from the first page".
+def decode_cursor(token, length):
+    if not token:
+        return None
+
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, TypeError):
+        return None
+
+    if not isinstance(values, list) or len(values) != length:
+        return None
+
+    return values
+
+
+# Builds the filter that selects every row that comes after the cursor values for the given ordering.
+# For an ordering of ("-current_price", "-id") and a cursor of (price, id), this is:
+# current_price <= price AND (current_price < price OR (current_price = price AND id < id)).
+# The first part says the same as the rest, but on its own, so the database can jump straight to the cursor in an
+# index on the first field instead of walking the index from the start.
+def _after(ordering, values):
+    condition = Q()
+    equal_so_far = Q()
+
+    for field, value in zip(ordering, values):
+        name = field.lstrip("-")
+        lookup = "lt" if field.startswith("-") else "gt"
+        condition |= equal_so_far & Q(**{name + "__" + lookup: value})
+        equal_so_far &= Q(**{name: value})
+
+    if len(ordering) > 1:
+        first = ordering[0]
+        lookup = "lte" if first.startswith("-") else "gte"
+        condition = Q(**{first.lstrip("-") + "__" + lookup: values[0]}) & condition
+
+    return condition
+
+
+# Returns one page of a queryset along with the token for the next page (None if this is the last page).
+# The last field of the ordering must be unique (normally "id" or "-id") so that the order is stable.
+def keyset_page(queryset, ordering, token=None, page_size=PAGE_SIZE):
+    values = decode_cursor(token, len(ordering))
+    if values is not None:
+        queryset = queryset.filter(_after(ordering, values))
+
+    # Get one extra row so we know whether there is a next page without a separate COUNT query.
+    rows = list(queryset.order_by(*ordering)[:page_size + 1])
+    page = rows[:page_size]
+
+    next_cursor = None
+    if len(rows) > page_size:
+        last = page[-1]
+        next_cursor = encode_cursor(_value(last, field.lstrip("-")) for field in ordering)
+
+    return page, next_cursor
+
+
+# Reads an ordering field from a row, which may be a model instance or a dict from .values().
+def _value(row, name):
+    if isinstance(row, dict):
+        return row[name]
+    return getattr(row, name)
@@ -0,0 +1,210 @@
+# Request profiling.
+#
+# ProfilingMiddleware records, for a sample of requests (PROFILING_SAMPLE_RATE), how long the request took, how many
+# SQL queries it made and how long they took, how long templates took to render and which queries were slowest. The
+# numbers are sent back in a Server-Timing header (shown in the browser's developer tools) and kept in a rolling
+# buffer of recent requests in each server process, shown to staff on the profiling page.
+#
+# Requests that aren't sampled only cost a random number. For sampled ones, queries are timed by a wrapper that is
+# installed on every database connection (it does nothing outside a sampled request) and templates by the
+# ProfiledTemplates backend. The profile of the current request is kept in a context variable, so it is found from
+# the threads that async views run their queries in, too.
+
+import asyncio
+import heapq
+import random
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from asgiref.sync import markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template.backends.django import DjangoTemplates
+from django.utils import timezone
+
+
+# The number of slowest queries kept for each request.
+SLOWEST_QUERIES = 5
+
+# The profile of the request being handled, or None if it isn't being profiled.
+_current = ContextVar("profile", default=None)
+
+# The most recent profiled requests in this process, oldest first.
+recent = deque(maxlen=settings.PROFILING_BUFFER_SIZE)
+
+
+# What is recorded while a request is profiled.
+class Profile:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.rendering = False
+        # (seconds, SQL) of the slowest queries so far, as a heap with the fastest of them first.
+        self.queries = []
+
+    def add_query(self, sql, seconds):
+        self.sql_count += 1
+        self.sql_time += seconds
+        if len(self.queries) < SLOWEST_QUERIES:
+            heapq.heappush(self.queries, (seconds, sql))
+        elif seconds > self.queries[0][0]:
+            heapq.heapreplace(self.queries, (seconds, sql))
+
+
+# Times every query made while a request is profiled. Installed on each new database connection.
+def record_query(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.add_query(sql, time.perf_counter() - start)
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+# The Django template backend, timing how long templates take to render while a request is profiled. A template
+# rendered while another is rendering (e.g. with render_to_string from a template tag) is counted as part of it.
+class ProfiledTemplates(DjangoTemplates):
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+# A template from ProfiledTemplates, which adds the time it takes to render to the request's profile.
+class TimedTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        profile = _current.get()
+        if profile is None or profile.rendering:
+            return self.template.render(context, request)
+
+        profile.rendering = True
+        start = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            profile.template_time += time.perf_counter() - start
+            profile.rendering = False
+
+
+# Records the requests picked by PROFILING_SAMPLE_RATE. Works with both sync and async views, without moving
+# async requests to a thread.
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # Tells Django this middleware is a coroutine function.
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        if not sampled():
+            return self.get_response(request)
+
+        profile = Profile()
+        token = _current.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return finish(profile, request, response)
+
+    async def __acall__(self, request):
+        if not sampled():
+            return await self.get_response(request)
+
+        profile = Profile()
+        token = _current.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return finish(profile, request, response)
+
+
+# Whether to profile a request.
+def sampled():
+    rate = settings.PROFILING_SAMPLE_RATE
+    return rate >= 1 or random.random() < rate
+
+
+# Adds a finished request's profile to the recent requests and its Server-Timing header to the response.
+def finish(profile, request, response):
+    total = time.perf_counter() - profile.start
+    match = request.resolver_match
+
+    recent.append({
+        "time": timezone.now(),
+        "method": request.method,
+        "path": request.path,
+        "view": match.view_name if match else "",
+        "status": response.status_code,
+        "total": total * 1000,
+        "sql_count": profile.sql_count,
+        "sql_time": profile.sql_time * 1000,
+        "template_time": profile.template_time * 1000,
+        "queries": [(seconds * 1000, sql) for seconds, sql in sorted(profile.queries, reverse=True)],
+    })
+
+    response["Server-Timing"] = ", ".join([
+        "total;dur=%.1f" % (total * 1000),
+        'sql;dur=%.1f;desc="%d queries"' % (profile.sql_time * 1000, profile.sql_count),
+        "templates;dur=%.1f" % (profile.template_time * 1000),
+    ])
+    return response
+
+
+# Sums up the recent requests for the profiling page: for each view, how many requests there were and their average
+# and slowest times, slowest on average first; and the slowest queries, with the view that made them.
+def summary(slowest=20):
+    requests = list(recent)
+
+    views = {}
+    for entry in requests:
+        views.setdefault(entry["view"] or entry["path"], []).append(entry)
+
+    per_view = [
+        {
+            "view": view,
+            "count": len(entries),
+            "average": sum(entry["total"] for entry in entries) / len(entries),
+            "slowest": max(entry["total"] for entry in entries),
+            "sql_count": sum(entry["sql_count"] for entry in entries) / len(entries),
+            "sql_time": sum(entry["sql_time"] for entry in entries) / len(entries),
+            "template_time": sum(entry["template_time"] for entry in entries) / len(entries),
+        }
+        for view, entries in views.items()
+    ]
+    per_view.sort(key=lambda row: row["average"], reverse=True)
+
+    queries = heapq.nlargest(slowest, (
+        {"time": milliseconds, "sql": sql, "view": entry["view"] or entry["path"], "path": entry["path"]}
+        for entry in requests for milliseconds, sql in entry["queries"]
+    ), key=lambda query: query["time"])
+
+    return {"requests": requests[::-1], "views": per_view, "queries": queries}
@@ -0,0 +1,67 @@
+# Full-text search over listings.
+#
+# Searching titles and 2000-character descriptions with LIKE '%word%' (icontains) means reading every listing on
+# every search. Instead, the auctions_listing_search FTS5 table (see migration 0013) keeps an inverted index of the
+# words in each listing, kept in sync by triggers, and ranks matches with BM25.
+
+import re
+
+from django.db import connections, router
+
+from .models import AuctionListing
+from .pagination import PAGE_SIZE, decode_cursor, encode_cursor
+
+
+# Turns what the user typed into an FTS5 query. Every word has to match, and the last word also matches as a
+# prefix, so results show up while a word is still being typed. Words are quoted so that characters with a
+# special meaning to FTS5 are searched for as plain text.
+def match_query(text):
+    words = re.findall(r"\w+", text)
+    if not words:
+        return None
+
+    terms = ['"%s"' % word for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+# Returns one page of active listings matching the search text, best matches first, along with the token for the
+# next page (None if this is the last page). Pages are found by (rank, id) rather than with OFFSET.
+# Only the listings' id and version are loaded, for their cached cards.
+def search_listings(text, token=None, page_size=PAGE_SIZE):
+    query = match_query(text)
+    if query is None:
+        return [], None
+
+    sql = """
+        SELECT listing.id, listing.version, search.rank
+        FROM auctions_listing_search AS search
+        JOIN auctions_auctionlisting AS listing ON listing.id = search.rowid
+        WHERE auctions_listing_search MATCH %s AND listing.status = 'ACTIVE'
+    """
+    params = [query]
+
+    values = decode_cursor(token, 2)
+    try:
+        rank, listing_id = float(values[0]), int(values[1])
+    except (TypeError, ValueError):
+        pass
+    else:
+        sql += " AND (search.rank > %s OR (search.rank = %s AND listing.id > %s))"
+        params += [rank, rank, listing_id]
+
+    # Get one extra row so we know whether there is a next page.
+    sql += " ORDER BY search.rank, listing.id LIMIT %s"
+    params.append(page_size + 1)
+
+    with connections[router.db_for_read(AuctionListing)].cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    page = rows[:page_size]
+    next_cursor = None
+    if len(rows) > page_size:
+        listing_id, version, rank = page[-1]
+        next_cursor = encode_cursor([repr(rank), listing_id])
+
+    return [AuctionListing(id=listing_id, version=version) for listing_id, version, rank in page], next_cursor
@@ -0,0 +1,92 @@
+# The production SQLite profile (see SQLITE_PRODUCTION in settings.py).
+#
+# SQLite allows one writer at a time. With its default rollback journal, readers also have to wait while a write is
+# being committed, so several workers handling bids and comments quickly run into "database is locked". In WAL mode
+# readers never wait for the writer, and a busy timeout makes a second writer wait its turn instead of failing.
+
+import asyncio
+import contextvars
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+# The database alias used for read-only views when the production profile is on.
+READ_ALIAS = "read"
+
+# Whether the current request is being handled by a read-only view.
+_read_only = contextvars.ContextVar("read_only", default=False)
+
+
+# Sets the pragmas for every new SQLite connection when the production profile is on.
+@receiver(connection_created)
+def set_pragmas(sender, connection, **kwargs):
+    if connection.vendor != "sqlite" or not settings.SQLITE_PRODUCTION:
+        return
+
+    with connection.cursor() as cursor:
+        # The journal mode is stored in the database file, so only the writable connection needs to set it.
+        if connection.alias != READ_ALIAS:
+            cursor.execute("PRAGMA journal_mode=WAL")
+        # In WAL mode, NORMAL only syncs at checkpoints. A power cut can lose the last commits but can't corrupt
+        # the database.
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA busy_timeout=%d" % (settings.SQLITE_BUSY_TIMEOUT * 1000))
+        cursor.execute("PRAGMA temp_store=MEMORY")
+
+
+# A view decorator for views that only read from the database. While the view runs, its queries go to the read-only
+# connection (if there is one). Works for both normal and async views.
+def read_only(view):
+    if asyncio.iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            token = _read_only.set(True)
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _read_only.reset(token)
+
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token = _read_only.set(True)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _read_only.reset(token)
+
+    return wrapper
+
+
+# The alias read-only views read from: the read-only connection, unless there isn't one or it's only a mirror of the
+# default connection. Under the test runner it is a mirror (see TEST in settings.py): a second connection to the test
+# database, which can't see what a test has written inside its transaction.
+def read_alias():
+    if READ_ALIAS not in connections:
+        return "default"
+    if connections[READ_ALIAS].settings_dict["NAME"] == connections["default"].settings_dict["NAME"]:
+        return "default"
+    return READ_ALIAS
+
+
+# A database router that sends queries made by read-only views to the read-only connection and everything else
+# to the default connection. Both connections are to the same database file.
+class ReadRouter:
+    def db_for_read(self, model, **hints):
+        if _read_only.get():
+            return read_alias()
+        return "default"
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
@@ -0,0 +1,154 @@
+# Static files (CSS and the admin's scripts and images), with fingerprinted names and precompressed copies.
+#
+# collectstatic copies the static files into STATIC_ROOT, each under a name with a hash of its contents in it (e.g.
+# auctions/styles.3f2a9c1b0d4e.css), and records the names in a manifest that {% static %} looks them up in. A
+# fingerprinted name always means the same file, so browsers can keep it for a year without asking again, and a
+# changed file gets a new name. Text files are also saved compressed with gzip (.gz) and, if the brotli package is
+# installed, brotli (.br), so they are compressed once when they're collected rather than on every request.
+#
+# serve_static() sends the collected files from the server process itself (see views.static), picking the smallest
+# copy the browser accepts.
+#
+# Until collectstatic has been run (e.g. when developing or testing), {% static %} uses the files' plain names.
+# After that, a file that isn't in the manifest is an error unless DEBUG is on.
+
+import gzip
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles import views as staticfiles_views
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.http import Http404
+from django.utils.cache import patch_vary_headers
+from django.views.static import serve
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# The kinds of file worth compressing. Images (other than SVG) and fonts are compressed already.
+COMPRESSIBLE = (".css", ".js", ".svg", ".txt", ".json", ".map", ".html", ".xml")
+
+# The compressed copies of a file, by the suffix added to its name, with the Content-Encoding they are sent with.
+# The first one the browser accepts is sent, so the smallest comes first.
+ENCODINGS = [(".br", "br"), (".gz", "gzip")]
+
+# How long browsers keep a file with a fingerprinted name.
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+# Gzip and brotli compress a file's contents.
+def _gzip(content):
+    return gzip.compress(content, compresslevel=9, mtime=0)
+
+
+def _brotli(content):
+    return brotli.compress(content, quality=11)
+
+
+COMPRESSORS = {".gz": _gzip}
+if brotli is not None:
+    COMPRESSORS[".br"] = _brotli
+
+
+# The storage collectstatic saves the files with, and {% static %} finds their names in.
+class CompressedManifestStorage(ManifestStaticFilesStorage):
+    # Saves the compressed copies of every text file, under both its plain and fingerprinted names, once the
+    # fingerprinted names are known.
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+
+        for name in set(paths) | set(self.hashed_files.values()):
+            if name.endswith(COMPRESSIBLE) and self.exists(name):
+                self.compress(name)
+
+    # Saves the compressed copies of one file. A copy that isn't smaller than the file isn't kept.
+    def compress(self, name):
+        with self.open(name) as file:
+            content = file.read()
+
+        for suffix, compressor in COMPRESSORS.items():
+            path = self.path(name + suffix)
+            compressed = compressor(content)
+            if len(compressed) < len(content):
+                with open(path, "wb") as file:
+                    file.write(compressed)
+            elif os.path.exists(path):
+                os.remove(path)
+
+    # The manifest's fingerprinted names, as a set, so serve_static can tell them from plain names without going
+    # through the manifest on every request. Kept in step with the manifest when it's loaded and saved.
+    def load_manifest(self):
+        hashed_files = super().load_manifest()
+        self.hashed_names = set(hashed_files.values())
+        return hashed_files
+
+    def save_manifest(self):
+        super().save_manifest()
+        self.hashed_names = set(self.hashed_files.values())
+
+    # A file that isn't in the manifest keeps its plain name while there is no manifest (collectstatic hasn't been
+    # run) or DEBUG is on. Otherwise it's an error, as it is with ManifestStaticFilesStorage, so a file left out of
+    # collectstatic shows up instead of being linked by a name that isn't served.
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            if self.hashed_files and not settings.DEBUG:
+                raise
+            return name
+
+
+# The encodings named in an Accept-Encoding header, except ones the browser says it doesn't want ("q=0").
+def accepted_encodings(header):
+    encodings = set()
+    for part in header.split(","):
+        encoding, _, parameters = part.partition(";")
+        name, _, value = parameters.replace(" ", "").partition("=")
+        try:
+            refused = name == "q" and float(value) == 0
+        except ValueError:
+            refused = False
+        if not refused:
+            encodings.add(encoding.strip().lower())
+    return encodings
+
+
+# Sends a file from STATIC_ROOT, compressed if the browser accepts one of its compressed copies. Fingerprinted names
+# are cached by browsers for a year; plain names are checked with the server every time. With DEBUG on, files that
+# haven't been collected are found in the apps' static directories instead.
+def serve_static(request, path):
+    root = settings.STATIC_ROOT
+    compressible = path.endswith(COMPRESSIBLE)
+    response = None
+
+    if compressible:
+        accepted = accepted_encodings(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        for suffix, encoding in ENCODINGS:
+            if encoding in accepted and os.path.isfile(os.path.join(root, path + suffix)):
+                response = serve(request, path + suffix, document_root=root)
+                response["Content-Encoding"] = encoding
+                # FileResponse names the compressed file, which isn't what the browser asked for.
+                if response.has_header("Content-Disposition"):
+                    del response["Content-Disposition"]
+                break
+
+    if response is None:
+        try:
+            response = serve(request, path, document_root=root)
+        except Http404:
+            if not settings.DEBUG:
+                raise
+            return staticfiles_views.serve(request, path)
+
+    if compressible:
+        patch_vary_headers(response, ["Accept-Encoding"])
+    if path in getattr(staticfiles_storage, "hashed_names", ()):
+        response["Cache-Control"] = IMMUTABLE
+    else:
+        response["Cache-Control"] = "no-cache"
+    return response
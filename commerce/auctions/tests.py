@@ -1,3 +1,1405 @@
-from django.test import TestCase
+import asyncio
+import functools
+import gzip
+import io
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import live, profiling, views
+from .backends import user_key
+from .management.commands import run_auction_scheduler
+from .leaderboards import compute_leaderboards, prune_activity
+from .images import UPLOADS_ENABLED, make_thumbnails_later, save_image
+from .cards import card_key
+from .counters import recount_listings
+from .bidding import place_bid, close_listing, close_expired, next_deadline, recount_categories
+from .pagination import PAGE_SIZE, keyset_page
+from .search import search_listings
+from .sqlite import READ_ALIAS, ReadRouter, read_only
+from .staticfiles import brotli
+from .models import User, Category, AuctionListing, WatchList, Bid, ListingComment, ListingActivity
+from .urls import urlpatterns
+from .views import browse_page
+
+
+# Creates a user, a category and an active listing to bid on, counted in its category's active listings.
+def make_listing(price="1.00"):
+    owner = User.objects.create_user("owner", "owner@example.com", "password")
+    category, _ = Category.objects.get_or_create(name="Tools")
+    listing = AuctionListing.objects.create(
+        user_ID=owner,
+        title="Hammer",
+        description="A hammer.",
+        current_price=Decimal(price),
+        image_URL="https://example.com/hammer.png",
+        category=category,
+    )
+    return owner, listing
+
+
+class PaginationTests(TestCase):
+    def setUp(self):
+        self.owner, self.listing = make_listing()
+        # Several pages of listings, a few of them closed, with only a few different prices between them.
+        for index in range(2 * PAGE_SIZE + 10):
+            AuctionListing.objects.create(
+                user_ID=self.owner, title=f"Item {index}", description="An item.",
+                current_price=Decimal(index % 3), image_URL="https://example.com/item.png",
+                category=self.listing.category, status="CLOSED" if index % 7 == 0 else "ACTIVE",
+            )
+
+    def test_homepage_pages_show_every_active_listing_once(self):
+        seen = []
+        cursor = None
+        while True:
+            response = self.client.get(reverse("index"), {"cursor": cursor} if cursor else {})
+            seen.extend(int(id) for id in re.findall(r'href="/(\d+)/get_listing"', response.content.decode()))
+            cursor = response.context["next_cursor"]
+            if not cursor:
+                break
+
+        expected = list(AuctionListing.objects.filter(status="ACTIVE").order_by("-id").values_list("id", flat=True))
+        self.assertGreater(len(expected), 2 * PAGE_SIZE)
+        self.assertEqual(seen, expected)
+
+    def test_equal_sort_keys_are_not_repeated_or_skipped(self):
+        listings = AuctionListing.objects.filter(status="ACTIVE")
+        seen = []
+        cursor = None
+        while True:
+            page, cursor = keyset_page(listings, ("-current_price", "-id"), cursor, page_size=4)
+            seen.extend(page)
+            if not cursor:
+                break
+
+        self.assertEqual(seen, list(listings.order_by("-current_price", "-id")))
+
+    def test_listing_pages_show_every_comment_once(self):
+        ListingComment.objects.bulk_create([
+            ListingComment(user_ID=self.owner, listing=self.listing, comment=f"Comment {index}.")
+            for index in range(2 * PAGE_SIZE + 10)
+        ])
+        ListingComment.objects.create(user_ID=self.owner, listing_id=self.listing.id + 1, comment="Elsewhere.")
+
+        seen = []
+        cursor = None
+        while True:
+            url = reverse("get_listing", args=[self.listing.id])
+            response = self.client.get(url, {"comments": cursor} if cursor else {})
+            seen.extend(comment.id for comment in response.context["comments"])
+            cursor = response.context["comments_cursor"]
+            if not cursor:
+                break
+
+        expected = list(ListingComment.objects.filter(listing=self.listing).order_by("id").values_list("id", flat=True))
+        self.assertGreater(len(expected), 2 * PAGE_SIZE)
+        self.assertEqual(seen, expected)
+
+    def test_bad_cursor_starts_from_the_first_page(self):
+        first, _ = keyset_page(AuctionListing.objects.all(), ("-id",))
+        self.assertEqual(keyset_page(AuctionListing.objects.all(), ("-id",), "not-a-cursor")[0], first)
+
+
+class PlaceBidTests(TestCase):
+    def setUp(self):
+        self.owner, self.listing = make_listing("10.00")
+        self.bidder = User.objects.create_user("bidder", "bidder@example.com", "password")
+
+    def test_higher_bid_raises_price(self):
+        bid = place_bid(self.bidder, self.listing.id, Decimal("12.50"))
+
+        self.listing.refresh_from_db()
+        self.assertEqual(bid.amount_bid, Decimal("12.50"))
+        self.assertEqual(self.listing.current_price, Decimal("12.50"))
+
+    def test_bid_not_above_price_is_rejected(self):
+        self.assertIsNone(place_bid(self.bidder, self.listing.id, Decimal("10.00")))
+        self.assertIsNone(place_bid(self.bidder, self.listing.id, Decimal("9.99")))
+
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.current_price, Decimal("10.00"))
+        self.assertFalse(Bid.objects.exists())
+
+    def test_bid_on_closed_listing_is_rejected(self):
+        AuctionListing.objects.filter(id=self.listing.id).update(status="CLOSED")
+
+        self.assertIsNone(place_bid(self.bidder, self.listing.id, Decimal("50.00")))
+        self.assertFalse(Bid.objects.exists())
+
+
+class CloseListingTests(TestCase):
+    def setUp(self):
+        self.owner, self.listing = make_listing("10.00")
+        self.first = User.objects.create_user("first", "first@example.com", "password")
+        self.second = User.objects.create_user("second", "second@example.com", "password")
+
+    def test_leading_bidder_wins(self):
+        place_bid(self.first, self.listing.id, Decimal("20.00"))
+        place_bid(self.second, self.listing.id, Decimal("30.00"))
+        place_bid(self.first, self.listing.id, Decimal("25.00"))
+
+        self.assertTrue(close_listing(self.listing.id))
+
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.status, "CLOSED")
+        self.assertEqual(self.listing.winner, self.second)
+        self.assertEqual(self.listing.leading_bid.amount_bid, Decimal("30.00"))
+
+    def test_tie_goes_to_earliest_bid(self):
+        place_bid(self.first, self.listing.id, Decimal("20.00"))
+        place_bid(self.second, self.listing.id, Decimal("20.00"))
+
+        close_listing(self.listing.id)
+
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.winner, self.first)
+
+    def test_close_without_bids(self):
+        self.assertTrue(close_listing(self.listing.id))
+
+        self.listing.refresh_from_db()
+        self.assertIsNone(self.listing.winner)
+
+    def test_close_twice_counts_once(self):
+        self.assertTrue(close_listing(self.listing.id))
+        self.assertFalse(close_listing(self.listing.id))
+
+        self.assertEqual(Category.objects.get(id=self.listing.category_id).active_count, 0)
+
+    def test_saved_and_deleted_listings_are_counted(self):
+        category = Category.objects.get(id=self.listing.category_id)
+        self.assertEqual(Category.objects.get(id=category.id).active_count, 1)
+        other = AuctionListing.objects.create(
+            user_ID=self.first, title="Saw", description="A saw.", current_price=Decimal("1.00"),
+            image_URL="https://example.com/saw.png", category=category
+        )
+        self.assertEqual(Category.objects.get(id=category.id).active_count, 2)
+        other.delete()
+        self.assertEqual(Category.objects.get(id=category.id).active_count, 1)
+
+    def test_moved_and_edited_listings_are_counted_once(self):
+        tools = Category.objects.get(id=self.listing.category_id)
+        food, _ = Category.objects.get_or_create(name="Food")
+        counts = lambda: dict(Category.objects.filter(id__in=[tools.id, food.id]).values_list("name", "active_count"))
+
+        self.listing.category = food
+        self.listing.save()
+        self.listing.title = "Hammer"
+        self.listing.save()
+        self.assertEqual(counts(), {"Tools": 0, "Food": 1})
+
+        # Saving a listing doesn't count its category's listings.
+        listing = AuctionListing.objects.get(id=self.listing.id)
+        listing.title = "Mallet"
+        with self.assertNumQueries(1):
+            listing.save(update_fields=["title"])
+
+        listing.status = "CLOSED"
+        listing.save()
+        AuctionListing.objects.get(id=self.listing.id).delete()
+        self.assertEqual(counts(), {"Tools": 0, "Food": 0})
+
+    def test_close_with_a_wrong_count_stays_at_zero(self):
+        Category.objects.filter(id=self.listing.category_id).update(active_count=0)
+
+        self.assertTrue(close_listing(self.listing.id))
+        self.assertEqual(Category.objects.get(id=self.listing.category_id).active_count, 0)
+
+
+class WatchListTests(TestCase):
+    def setUp(self):
+        self.owner, self.listing = make_listing()
+        self.watcher = User.objects.create_user("watcher", "watcher@example.com", "password")
+        self.client.force_login(self.watcher)
+
+    def test_adding_twice_keeps_one_row(self):
+        self.client.post(f"/{self.listing.id}/add_listing")
+        response = self.client.post(f"/{self.listing.id}/add_listing")
+
+        self.assertContains(response, "Remove from Watch List")
+        self.assertEqual(WatchList.objects.filter(user_ID=self.watcher).count(), 1)
+
+    def test_remove(self):
+        self.client.post(f"/{self.listing.id}/add_listing")
+        response = self.client.post(f"/{self.listing.id}/remove")
+
+        self.assertContains(response, "Add to Watch List")
+        self.assertFalse(WatchList.objects.exists())
+
+    def test_nav_bar_counts_the_watchlist(self):
+        WatchList.objects.create(user_ID=self.watcher, single_listing_watched=self.listing)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("categories"))
+        self.assertContains(response, "Watchlist (1)")
+        self.assertTrue(any("COUNT(" in query["sql"] for query in queries.captured_queries))
+        self.assertContains(self.client.get(reverse("get_listing", args=[self.listing.id])), "Watchlist (1)")
+
+
+class ListingCardTests(TestCase):
+    def setUp(self):
+        self.owner, self.listing = make_listing("10.00")
+        self.bidder = User.objects.create_user("bidder", "bidder@example.com", "password")
+        cache.clear()
+
+    def test_cached_cards_skip_loading_listings(self):
+        with self.assertNumQueries(2):
+            self.client.get(reverse("index"))
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("index"))
+
+        self.assertContains(response, "Hammer")
+        self.assertContains(response, "$10.00")
+
+    def test_bid_and_edit_replace_cached_card(self):
+        self.client.get(reverse("index"))
+
+        place_bid(self.bidder, self.listing.id, Decimal("12.00"))
+        self.assertContains(self.client.get(reverse("index")), "$12.00")
+
+        listing = AuctionListing.objects.get(id=self.listing.id)
+        listing.title = "Mallet"
+        listing.save()
+        self.assertContains(self.client.get(reverse("index")), "Mallet")
+
+    def test_closed_listing_leaves_homepage(self):
+        self.client.get(reverse("index"))
+        close_listing(self.listing.id)
+
+        self.assertNotContains(self.client.get(reverse("index")), "Hammer")
+
+    def test_listing_given_a_deleted_listings_id_gets_its_own_card(self):
+        self.client.get(reverse("index"))
+        self.listing.save()
+        self.client.get(reverse("index"))
+        listing_id, category = self.listing.id, self.listing.category
+        keys = [card_key(listing_id, 1), card_key(listing_id, 2)]
+        self.assertEqual(len(cache.get_many(keys)), 2)
+        self.listing.delete()
+        self.assertEqual(cache.get_many(keys), {})
+
+        AuctionListing.objects.create(
+            id=listing_id, user_ID=self.owner, title="Saw", description="A saw.", current_price=Decimal("3.00"),
+            image_URL="https://example.com/saw.png", category=category
+        )
+
+        response = self.client.get(reverse("index"))
+        self.assertContains(response, "Saw")
+        self.assertNotContains(response, "Hammer")
+
+
+class BrowseTests(TestCase):
+    def setUp(self):
+        self.owner, self.listing = make_listing("5.00")
+        self.other_category = Category.objects.create(name="Toys")
+        # Prices with repeats, so that pages have to split listings with the same price.
+        for index, price in enumerate(["3.00", "5.00", "5.00", "8.00", "1.00", "5.00", "12.00"]):
+            AuctionListing.objects.create(
+                user_ID=self.owner, title=f"Item {index}", description="An item.", current_price=Decimal(price),
+                image_URL="https://example.com/item.png",
+                category=self.other_category if index % 2 else self.listing.category,
+            )
+        AuctionListing.objects.create(
+            user_ID=self.owner, title="Closed", description="A closed item.", current_price=Decimal("2.00"),
+            image_URL="https://example.com/item.png", category=self.listing.category, status="CLOSED",
+        )
+        self.active = AuctionListing.objects.filter(status="ACTIVE")
+
+    # Reads every page of listings for a query string, two at a time, and returns them.
+    def browse(self, query, listings=None):
+        listings = self.active if listings is None else listings
+        seen = []
+        cursor = None
+        while True:
+            url = "/?" + query + (f"&cursor={cursor}" if cursor else "")
+            with mock.patch("auctions.views.keyset_page", functools.partial(keyset_page, page_size=2)):
+                _, page, cursor = browse_page(RequestFactory().get(url), listings)
+            seen.extend(page)
+            if not cursor:
+                return seen
+
+    def test_sorts_by_price_across_pages(self):
+        expected = list(self.active.order_by("current_price", "id"))
+        self.assertEqual(self.browse("sort=price_low"), expected)
+        self.assertEqual(self.browse("sort=price_high"), expected[::-1])
+        self.assertEqual(self.browse(""), list(self.active.order_by("-id")))
+
+    def test_filters_by_price_range(self):
+        listings = self.browse("sort=price_low&min_price=3&max_price=8")
+        self.assertEqual([str(listing.current_price) for listing in listings], ["3.00", "5.00", "5.00", "5.00",
+                                                                              "5.00", "8.00"])
+
+        category = self.active.filter(category=self.other_category)
+        listings = self.browse("sort=price_high&max_price=8", category)
+        self.assertEqual([str(listing.current_price) for listing in listings], ["8.00", "5.00", "5.00"])
+
+    def test_invalid_choices_are_ignored(self):
+        self.assertEqual(self.browse("sort=cheapest&min_price=lots"), list(self.active.order_by("-id")))
+
+    def test_next_page_link_keeps_choices(self):
+        with mock.patch("auctions.views.keyset_page", functools.partial(keyset_page, page_size=2)):
+            response = self.client.get(reverse("category_listings", args=["Tools"]),
+                                       {"sort": "price_low", "min_price": "2", "junk": "x"})
+
+        self.assertContains(response, "?sort=price_low&amp;min_price=2&cursor=")
+        self.assertContains(response, '<option value="price_low" selected>')
+
+
+class AuctionExpiryTests(TestCase):
+    def setUp(self):
+        self.owner, self.listing = make_listing()
+        self.bidder = User.objects.create_user("bidder", "bidder@example.com", "password")
+        self.now = timezone.now()
+
+    # Makes count active listings in the listing's category whose auctions end at ends_at.
+    def make_listings(self, count, ends_at):
+        AuctionListing.objects.bulk_create([
+            AuctionListing(
+                user_ID=self.owner, title="Saw", description="A saw.", current_price=Decimal("1.00"),
+                starting_price=Decimal("1.00"), image_URL="https://example.com/saw.png",
+                category=self.listing.category, ends_at=ends_at
+            )
+            for _ in range(count)
+        ])
+        recount_categories(Category.objects.filter(id=self.listing.category_id))
+
+    def test_closes_ended_auctions_in_batches_with_a_fixed_number_of_queries(self):
+        self.make_listings(1200, self.now - timedelta(minutes=1))
+        self.make_listings(5, self.now + timedelta(hours=1))
+        ended = AuctionListing.objects.filter(ends_at__lte=self.now).first()
+        AuctionListing.objects.filter(id=ended.id).update(ends_at=None)
+        place_bid(self.bidder, ended.id, Decimal("2.00"))
+        AuctionListing.objects.filter(id=ended.id).update(ends_at=self.now - timedelta(minutes=1))
+
+        # Picking the batch, closing it and taking it off its category's count, plus the savepoint around them.
+        with self.assertNumQueries(5):
+            self.assertEqual(close_expired(self.now, 500), 500)
+        self.assertEqual(close_expired(self.now, 500), 500)
+        self.assertEqual(close_expired(self.now, 500), 200)
+        self.assertEqual(close_expired(self.now, 500), 0)
+
+        ended.refresh_from_db()
+        self.assertEqual((ended.status, ended.winner), ("CLOSED", self.bidder))
+        self.assertEqual(AuctionListing.objects.filter(status="ACTIVE").count(), 6)
+        self.assertEqual(Category.objects.get(id=self.listing.category_id).active_count, 6)
+        self.assertEqual(next_deadline(), self.now + timedelta(hours=1))
+
+    def test_no_bids_after_the_auction_ends(self):
+        AuctionListing.objects.filter(id=self.listing.id).update(ends_at=self.now - timedelta(seconds=1))
+
+        self.assertIsNone(place_bid(self.bidder, self.listing.id, Decimal("2.00")))
+
+    def test_scheduler_closes_ended_auctions(self):
+        self.make_listings(3, self.now - timedelta(minutes=1))
+
+        call_command("run_auction_scheduler", "--once", "--batch-size", "2", stdout=open(os.devnull, "w"))
+
+        self.assertEqual(AuctionListing.objects.filter(status="CLOSED").count(), 3)
+        self.assertIsNone(next_deadline())
+
+    def test_scheduler_sleeps_until_the_next_deadline_or_a_minute(self):
+        scheduler = run_auction_scheduler.Command()
+        self.assertEqual(scheduler.seconds_to_sleep(run_auction_scheduler.MAX_SLEEP), 60)
+
+        AuctionListing.objects.filter(id=self.listing.id).update(ends_at=timezone.now() + timedelta(hours=2))
+        self.assertEqual(scheduler.seconds_to_sleep(run_auction_scheduler.MAX_SLEEP), 60)
+
+        AuctionListing.objects.filter(id=self.listing.id).update(ends_at=timezone.now() + timedelta(seconds=20))
+        self.assertAlmostEqual(scheduler.seconds_to_sleep(run_auction_scheduler.MAX_SLEEP), 20, delta=5)
+
+    def test_scheduler_prunes_activity_on_its_own_interval(self):
+        ListingActivity.objects.create(listing=self.listing, bucket=self.now - timedelta(hours=3), bids=1)
+        sleeps = []
+
+        # Stops the scheduler on its second sleep.
+        def sleep(seconds):
+            sleeps.append(seconds)
+            if len(sleeps) == 2:
+                raise KeyboardInterrupt
+
+        with mock.patch.object(run_auction_scheduler.time, "sleep", sleep), \
+                mock.patch.object(run_auction_scheduler, "close_old_connections"):
+            call_command("run_auction_scheduler", "--prune-interval", "30", stdout=open(os.devnull, "w"))
+
+        self.assertFalse(ListingActivity.objects.exists())
+        self.assertAlmostEqual(sleeps[0], 30, delta=5)
+
+
+class CounterTests(TestCase):
+    def setUp(self):
+        self.owner, self.listing = make_listing()
+        self.buyer = User.objects.create_user("buyer", "buyer@example.com", "password")
+        self.client.force_login(self.buyer)
+
+    def counts(self):
+        return AuctionListing.objects.values_list("bid_count", "comment_count", "watcher_count").get(id=self.listing.id)
+
+    def post(self, name, data=None):
+        self.client.post(reverse(name, args=[self.listing.id]), data)
+
+    def test_views_keep_counts(self):
+        self.post("bid", {"bid": "5"})
+        self.post("bid", {"bid": "4"})
+        self.post("comment", {"textarea": "Nice!"})
+        self.post("add_listing")
+        self.post("add_listing")
+        self.assertEqual(self.counts(), (1, 1, 1))
+
+        self.post("remove")
+        self.post("remove")
+        self.assertEqual(self.counts(), (1, 1, 0))
+
+    def test_watcher_count_only_moves_for_rows_the_views_change(self):
+        # A row added by another request after this one looked at the watchlist isn't counted twice.
+        WatchList.objects.create(user_ID=self.buyer, single_listing_watched=self.listing)
+        with mock.patch("auctions.views.watched", return_value=False):
+            self.post("add_listing")
+        self.assertEqual(self.counts(), (0, 0, 0))
+
+        # Removing a row that was never counted doesn't take the count below zero.
+        self.post("remove")
+        self.assertEqual(self.counts(), (0, 0, 0))
+        self.assertFalse(WatchList.objects.exists())
+
+    def test_cards_show_counts(self):
+        self.post("bid", {"bid": "5"})
+        self.post("add_listing")
+
+        self.assertContains(self.client.get(reverse("index")), "1 bid &middot;\n            1 watcher &middot;")
+
+    def test_repair_fixes_drifted_counts(self):
+        other = AuctionListing.objects.create(
+            user_ID=self.owner, title="Saw", description="A saw.", current_price=Decimal("1.00"),
+            image_URL="https://example.com/saw.png", category=self.listing.category
+        )
+        self.post("bid", {"bid": "5"})
+        self.post("comment", {"textarea": "Nice!"})
+        ListingComment.objects.all().delete()
+        AuctionListing.objects.filter(id=other.id).update(watcher_count=3)
+        Category.objects.update(active_count=7)
+        versions = dict(AuctionListing.objects.values_list("id", "version"))
+
+        out = io.StringIO()
+        call_command("repair_counters", "--batch-size", "1", stdout=out)
+
+        self.assertIn("Fixed the counts of 2 listings.", out.getvalue())
+        self.assertEqual(self.counts(), (1, 0, 0))
+        self.assertEqual(AuctionListing.objects.get(id=other.id).watcher_count, 0)
+        self.assertEqual(
+            dict(Category.objects.values_list("name", "active_count")),
+            {category.name: category.listings.filter(status="ACTIVE").count() for category in Category.objects.all()}
+        )
+        self.assertEqual(
+            dict(AuctionListing.objects.values_list("id", "version")),
+            {listing_id: version + 1 for listing_id, version in versions.items()}
+        )
+        self.assertEqual(recount_listings(), 0)
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner, self.listing = make_listing()
+        self.other = AuctionListing.objects.create(
+            user_ID=self.owner, title="Saw", description="A saw.", current_price=Decimal("1.00"),
+            image_URL="https://example.com/saw.png", category=self.listing.category,
+        )
+        self.buyer = User.objects.create_user("buyer", "buyer@example.com", "password")
+
+    def activity(self, listing):
+        return list(ListingActivity.objects.filter(listing=listing).values_list("bids", "price_rise"))
+
+    def test_bids_are_added_to_the_current_bucket(self):
+        place_bid(self.buyer, self.listing.id, Decimal("5"))
+        place_bid(self.buyer, self.listing.id, Decimal("8.50"))
+        place_bid(self.buyer, self.listing.id, Decimal("2"))
+
+        # The first bid rises from the starting price, and the too-low bid isn't counted at all.
+        self.assertEqual(self.activity(self.listing), [(2, Decimal("7.50"))])
+
+    def test_boards_rank_the_last_hour(self):
+        place_bid(self.buyer, self.listing.id, Decimal("5"))
+        place_bid(self.buyer, self.listing.id, Decimal("6"))
+        place_bid(self.buyer, self.other.id, Decimal("5"))
+        place_bid(self.buyer, self.other.id, Decimal("50"))
+        place_bid(self.buyer, self.other.id, Decimal("60"))
+        # Activity from before the last hour doesn't count.
+        ListingActivity.objects.create(listing=self.listing, bucket=timezone.now() - timedelta(hours=2), bids=100,
+                                       price_rise=1000)
+        AuctionListing.objects.filter(id=self.listing.id).update(watcher_count=3)
+        AuctionListing.objects.filter(id=self.other.id).update(ends_at=timezone.now() + timedelta(hours=1))
+
+        boards = compute_leaderboards()
+        self.assertEqual([(id, total) for id, _, total in boards["most_bids"]], [(self.other.id, 3),
+                                                                                 (self.listing.id, 2)])
+        self.assertEqual([(id, total) for id, _, total in boards["rising"]], [(self.other.id, Decimal("59")),
+                                                                              (self.listing.id, Decimal("5"))])
+        self.assertEqual([id for id, _, _ in boards["most_watched"]], [self.listing.id])
+        self.assertEqual([id for id, _, _ in boards["ending_soon"]], [self.other.id])
+
+        self.assertEqual(prune_activity(timezone.now()), 1)
+        close_listing(self.other.id)
+        self.assertEqual([id for id, _, _ in compute_leaderboards()["most_bids"]], [self.listing.id])
+
+    def test_page_is_served_from_the_cache(self):
+        place_bid(self.buyer, self.listing.id, Decimal("5"))
+        response = self.client.get(reverse("leaderboards"))
+        self.assertContains(response, "1 bid</strong>")
+        self.assertContains(response, "View Hammer")
+
+        place_bid(self.buyer, self.other.id, Decimal("5"))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("leaderboards"))
+        self.assertNotContains(response, "View Saw")
+
+
+@override_settings(PROFILING_SAMPLE_RATE=1)
+class ProfilingTests(TestCase):
+    def setUp(self):
+        self.owner, self.listing = make_listing()
+        profiling.recent.clear()
+
+    def test_records_sql_and_template_time(self):
+        response = self.client.get(reverse("get_listing", args=[self.listing.id]))
+
+        timing = dict(part.split(";", 1) for part in response["Server-Timing"].split(", "))
+        self.assertEqual(set(timing), {"total", "sql", "templates"})
+        entry = profiling.recent[-1]
+        self.assertEqual(entry["view"], "get_listing")
+        self.assertIn('desc="%d queries"' % entry["sql_count"], timing["sql"])
+        self.assertGreater(entry["sql_count"], 0)
+        self.assertGreater(entry["template_time"], 0)
+        self.assertLessEqual(len(entry["queries"]), profiling.SLOWEST_QUERIES)
+        self.assertEqual(entry["queries"], sorted(entry["queries"], reverse=True))
+
+    @override_settings(PROFILING_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_not_recorded(self):
+        response = self.client.get(reverse("index"))
+
+        self.assertNotIn("Server-Timing", response)
+        self.assertEqual(len(profiling.recent), 0)
+
+    def test_only_staff_see_the_profiling_page(self):
+        self.client.force_login(self.owner)
+        self.assertEqual(self.client.get(reverse("profiling")).status_code, 302)
+
+        self.owner.is_staff = True
+        self.owner.save()
+        self.client.get(reverse("get_listing", args=[self.listing.id]))
+        response = self.client.get(reverse("profiling"))
+
+        self.assertContains(response, "get_listing")
+        self.assertContains(response, "SELECT")
+
+    def test_middleware_stays_async_in_an_async_chain(self):
+        async def get_response(request):
+            return HttpResponse()
+
+        middleware = profiling.ProfilingMiddleware(get_response)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        self.assertIn("Server-Timing", asyncio.run(middleware(RequestFactory().get("/"))))
+        self.assertFalse(asyncio.iscoroutinefunction(profiling.ProfilingMiddleware(lambda request: HttpResponse())))
+
+
+class CachedUserTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("user", "user@example.com", "password")
+        self.client.force_login(self.user)
+        self.url = reverse("watchlist")
+
+    def queries_for(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        return response, len(queries)
+
+    def test_user_comes_from_the_cache(self):
+        _, first = self.queries_for(self.url)
+        self.assertIsNotNone(cache.get(user_key(self.user.id)))
+
+        response, second = self.queries_for(self.url)
+        self.assertEqual(second, first - 1)
+        self.assertEqual(response.context["user"], self.user)
+
+    def test_only_some_fields_are_cached(self):
+        self.client.get(self.url)
+
+        self.assertEqual(cache.get(user_key(self.user.id)), {
+            "id": self.user.id, "username": "user", "is_active": True,
+            "session_auth_hash": self.user.get_session_auth_hash(),
+        })
+
+        # Fields that aren't cached are loaded when they are asked for.
+        User.objects.filter(id=self.user.id).update(is_staff=True)
+        user = self.client.get(self.url).context["user"]
+        with self.assertNumQueries(1):
+            self.assertTrue(user.is_staff)
+
+    def test_sessions_from_before_the_cached_backend_stay_logged_in(self):
+        self.client.force_login(self.user, backend="django.contrib.auth.backends.ModelBackend")
+
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_saving_a_user_replaces_the_cached_copy(self):
+        self.client.get(self.url)
+        self.user.first_name = "Changed"
+        self.user.save()
+
+        self.assertIsNone(cache.get(user_key(self.user.id)))
+        self.assertEqual(self.client.get(self.url).context["user"].first_name, "Changed")
+
+    def test_password_change_logs_out_other_sessions(self):
+        self.client.get(self.url)
+        self.user.set_password("new password")
+        self.user.save()
+
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+    def test_deleted_and_inactive_users_are_logged_out(self):
+        self.client.get(self.url)
+        User.objects.filter(id=self.user.id).update(is_active=False)
+        cache.delete(user_key(self.user.id))
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+        self.client.force_login(User.objects.create_user("other", "other@example.com", "password"))
+        self.client.get(self.url)
+        User.objects.get(username="other").delete()
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+
+class SqliteProfileTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "db.sqlite3")
+
+    # Opens a new connection to a database file in a temporary directory, with the production profile on.
+    def connect(self, alias, name):
+        wrapper = DatabaseWrapper(dict(connections["default"].settings_dict, NAME=name), alias)
+        self.addCleanup(wrapper.close)
+        with override_settings(SQLITE_PRODUCTION=True, SQLITE_BUSY_TIMEOUT=5):
+            wrapper.ensure_connection()
+        return wrapper
+
+    def pragmas(self, wrapper, *names):
+        with wrapper.cursor() as cursor:
+            return [cursor.execute(f"PRAGMA {name}").fetchone()[0] for name in names]
+
+    def test_pragmas_are_set_on_new_connections(self):
+        names = ("journal_mode", "synchronous", "busy_timeout", "temp_store")
+        writer = self.connect("default", self.path)
+        reader = self.connect(READ_ALIAS, f"file:{self.path}?mode=ro")
+
+        # WAL mode, synchronous=NORMAL, a busy timeout in milliseconds, and temporary tables in memory.
+        self.assertEqual(self.pragmas(writer, *names), ["wal", 1, 5000, 2])
+        self.assertEqual(self.pragmas(reader, *names), ["wal", 1, 5000, 2])
+
+    def test_read_connection_cannot_write(self):
+        with self.connect("default", self.path).cursor() as cursor:
+            cursor.execute("CREATE TABLE item (name TEXT)")
+            cursor.execute("INSERT INTO item VALUES ('saw')")
+
+        with self.connect(READ_ALIAS, f"file:{self.path}?mode=ro").cursor() as cursor:
+            self.assertEqual(cursor.execute("SELECT name FROM item").fetchall(), [("saw",)])
+            with self.assertRaises(OperationalError):
+                cursor.execute("INSERT INTO item VALUES ('hammer')")
+
+    def test_read_only_views_read_from_the_read_connection(self):
+        router = ReadRouter()
+        view = read_only(lambda request: (router.db_for_read(AuctionListing), router.db_for_write(AuctionListing)))
+
+        @read_only
+        async def async_view(request):
+            return router.db_for_read(AuctionListing)
+
+        # As if the read-only connection were a separate one, as it is outside the test runner.
+        with mock.patch("auctions.sqlite.read_alias", return_value=READ_ALIAS):
+            self.assertEqual(view(None), (READ_ALIAS, "default"))
+            self.assertEqual(asyncio.run(async_view(None)), READ_ALIAS)
+            self.assertEqual(router.db_for_read(AuctionListing), "default")
+
+    def test_tests_read_from_the_default_connection(self):
+        self.assertEqual(read_only(lambda request: ReadRouter().db_for_read(AuctionListing))(None), "default")
+
+
+class StaticFilesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.root = tempfile.TemporaryDirectory()
+        cls.settings = override_settings(STATIC_ROOT=cls.root.name)
+        cls.settings.enable()
+        call_command("collectstatic", interactive=False, verbosity=0)
+        cls.styles = staticfiles_storage.stored_name("auctions/styles.css")
+        # The admin's stylesheet, which is big enough to be worth compressing.
+        cls.admin_styles = staticfiles_storage.stored_name("admin/css/base.css")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings.disable()
+        cls.root.cleanup()
+        super().tearDownClass()
+
+    def get(self, name, accept=""):
+        return self.client.get("/static/" + name, HTTP_ACCEPT_ENCODING=accept)
+
+    def test_pages_link_fingerprinted_names(self):
+        self.assertRegex(self.styles, r"^auctions/styles\.[0-9a-f]{12}\.css$")
+        self.assertContains(self.client.get(reverse("index")), "/static/" + self.styles)
+
+    def test_fingerprinted_files_are_immutable_and_compressed(self):
+        plain = b"".join(self.get(self.admin_styles).streaming_content)
+        response = self.get(self.admin_styles, "gzip, deflate")
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Content-Type"], "text/css")
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertNotIn("Content-Disposition", response)
+        self.assertEqual(gzip.decompress(b"".join(response.streaming_content)), plain)
+
+    @skipUnless(brotli, "brotli isn't installed")
+    def test_brotli_is_preferred(self):
+        self.assertEqual(self.get(self.admin_styles, "gzip, br")["Content-Encoding"], "br")
+        self.assertEqual(self.get(self.admin_styles, "gzip, br;q=0")["Content-Encoding"], "gzip")
+
+    def test_plain_names_are_revalidated_and_small_files_sent_as_they_are(self):
+        response = self.get("admin/css/base.css", "gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Cache-Control"], "no-cache")
+
+        # Too small to be worth compressing.
+        response = self.get(self.styles, "gzip")
+
+        self.assertNotIn("Content-Encoding", response)
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertEqual(self.get("auctions/missing.css").status_code, 404)
+
+    def test_files_missing_from_the_manifest_are_errors_unless_debugging(self):
+        self.assertIn(self.styles, staticfiles_storage.hashed_names)
+        with self.assertRaises(ValueError):
+            staticfiles_storage.stored_name("auctions/missing.css")
+        with override_settings(DEBUG=True):
+            self.assertEqual(staticfiles_storage.stored_name("auctions/missing.css"), "auctions/missing.css")
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.owner, self.listing = make_listing()
+
+    def search(self, text, token=None, page_size=20):
+        listings, next_cursor = search_listings(text, token, page_size)
+        return [listing.id for listing in listings], next_cursor
+
+    def test_finds_title_and_description_words(self):
+        self.assertEqual(self.search("hammer")[0], [self.listing.id])
+        self.assertEqual(self.search("HAM")[0], [self.listing.id])
+        self.assertEqual(self.search("saw")[0], [])
+
+    def test_index_follows_edits_and_closing(self):
+        self.listing.title = "Mallet"
+        self.listing.save()
+        self.assertEqual(self.search("mallet")[0], [self.listing.id])
+
+        close_listing(self.listing.id)
+        self.assertEqual(self.search("mallet")[0], [])
+
+    def test_best_matches_first_and_pages(self):
+        other = AuctionListing.objects.create(
+            user_ID=self.owner,
+            title="Hammer hammer hammer",
+            description="Hammer.",
+            current_price=Decimal("1.00"),
+            image_URL="https://example.com/hammer.png",
+            category=self.listing.category,
+        )
+
+        first, token = self.search("hammer", page_size=1)
+        second, token = self.search("hammer", token, page_size=1)
+
+        self.assertEqual(first + second, [other.id, self.listing.id])
+        self.assertIsNone(token)
+
+    def test_quotes_special_characters(self):
+        self.assertEqual(self.search('"hammer" OR NOT -*')[0], [])
+        self.assertEqual(self.search("")[0], [])
+
+
+class LiveUpdateTests(TestCase):
+    def setUp(self):
+        self.owner, self.listing = make_listing()
+        self.buyer = User.objects.create_user("buyer", "buyer@example.com", "password")
+
+    def test_one_publish_reaches_every_subscriber_without_queries(self):
+        async def scenario():
+            queues = [live.subscribe(self.listing.id) for _ in range(50)]
+            other = live.subscribe(self.listing.id + 1)
+
+            # Publish from another thread, as a view would.
+            sent = await asyncio.get_running_loop().run_in_executor(
+                None, live.publish, self.listing.id, "bid", {"price": "5.00"}
+            )
+            messages = [await asyncio.wait_for(queue.get(), 1) for queue in queues]
+
+            for queue in queues:
+                live.unsubscribe(self.listing.id, queue)
+            live.unsubscribe(self.listing.id + 1, other)
+            return sent, messages, other.qsize()
+
+        with self.assertNumQueries(0):
+            sent, messages, other_waiting = asyncio.run(scenario())
+
+        self.assertEqual(sent, 50)
+        self.assertEqual(set(messages), {b'event: bid\ndata: {"price": "5.00"}\n\n'})
+        self.assertEqual(other_waiting, 0)
+        self.assertEqual(live.publish(self.listing.id, "bid", {}), 0)
+
+    def test_views_publish_bids_closes_and_comments(self):
+        with mock.patch("auctions.views.publish") as publish:
+            self.client.force_login(self.buyer)
+            self.client.post(reverse("bid", args=[self.listing.id]), {"bid": "5"})
+            self.client.post(reverse("bid", args=[self.listing.id]), {"bid": "2"})
+            self.client.post(reverse("comment", args=[self.listing.id]), {"textarea": "Nice!"})
+            self.client.force_login(self.owner)
+            self.client.post(reverse("close", args=[self.listing.id]))
+            self.client.post(reverse("close", args=[self.listing.id]))
+
+        self.assertEqual(publish.call_args_list, [
+            mock.call(self.listing.id, "bid", {"price": "5.00", "bidder": "buyer"}),
+            mock.call(self.listing.id, "comment", {"user": "buyer", "comment": "Nice!"}),
+            mock.call(self.listing.id, "close", {"winner": "buyer"}),
+        ])
+
+    # Opens a stream through the ASGI application, publishes a bid to it, and reads the bid back off the stream.
+    def test_stream_sends_events_until_disconnect(self):
+        disconnect = asyncio.Event()
+        sent = []
+
+        async def django_application(scope, receive, send):
+            raise AssertionError("Event streams should not reach Django.")
+
+        async def receive():
+            await disconnect.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+            if b"event: bid" in message.get("body", b""):
+                disconnect.set()
+
+        async def scenario():
+            application = live.with_events(django_application)
+            scope = {"type": "http", "method": "GET", "path": f"/{self.listing.id}/events"}
+            stream = asyncio.ensure_future(application(scope, receive, send))
+            while not live._subscribers:
+                await asyncio.sleep(0)
+
+            await asyncio.get_running_loop().run_in_executor(
+                None, live.publish, self.listing.id, "bid", {"price": "5.00", "bidder": "buyer"}
+            )
+            await asyncio.wait_for(stream, 1)
+
+        asyncio.run(scenario())
+
+        self.assertEqual(sent[0]["status"], 200)
+        self.assertIn((b"content-type", b"text/event-stream"), sent[0]["headers"])
+        event, data = sent[-1]["body"].decode().split("\n")[:2]
+        self.assertEqual(event, "event: bid")
+        self.assertEqual(json.loads(data[len("data: "):]), {"price": "5.00", "bidder": "buyer"})
+        self.assertEqual(live._subscribers, {})
+
+
+class ApiTests(TestCase):
+    def setUp(self):
+        self.owner, self.listing = make_listing()
+        self.buyer = User.objects.create_user("buyer", "buyer@example.com", "password")
+
+    def get(self, resource, **params):
+        return self.client.get(reverse("api", args=[resource]), params)
+
+    # Makes another listing like the one from make_listing().
+    def copy_listing(self):
+        return AuctionListing.objects.create(
+            user_ID=self.owner,
+            title="Saw",
+            description="A saw.",
+            current_price=Decimal("1.00"),
+            image_URL="https://example.com/saw.png",
+            category=self.listing.category,
+        )
+
+    def test_batched_lookup_is_one_query(self):
+        listings = [self.listing] + [self.copy_listing() for _ in range(99)]
+        ids = ",".join(str(listing.id) for listing in listings)
+
+        with self.assertNumQueries(1):
+            response = self.get("listings", ids=ids, fields="title,price,category,poster", limit=100)
+
+        results = response.json()["results"]
+        self.assertEqual(len(results), 100)
+        self.assertEqual(results[0], {
+            "id": self.listing.id, "title": "Hammer", "price": "1.00", "category": "Tools", "poster": "owner"
+        })
+        self.assertIsNone(response.json()["next_cursor"])
+
+    def test_bids_and_comments_for_many_listings_page_by_cursor(self):
+        other = self.copy_listing()
+        for amount in ("2", "3"):
+            place_bid(self.buyer, self.listing.id, Decimal(amount))
+        place_bid(self.buyer, other.id, Decimal("4"))
+        ListingComment.objects.create(user_ID=self.buyer, listing=other, comment="Nice!")
+
+        first = self.get("bids", listings=f"{self.listing.id},{other.id}", limit=2).json()
+        second = self.get("bids", listings=f"{self.listing.id},{other.id}", cursor=first["next_cursor"]).json()
+
+        amounts = [bid["amount"] for bid in first["results"] + second["results"]]
+        self.assertEqual(amounts, ["2.00", "3.00", "4.00"])
+        self.assertIsNone(second["next_cursor"])
+        self.assertEqual(self.get("comments", listings=other.id, fields="comment").json()["results"], [
+            {"id": ListingComment.objects.get(listing=other).id, "comment": "Nice!"}
+        ])
+
+    def test_bidders_and_commenters_are_only_sent_to_logged_in_users(self):
+        place_bid(self.buyer, self.listing.id, Decimal("2"))
+        ListingComment.objects.create(user_ID=self.buyer, listing=self.listing, comment="Nice!")
+
+        self.assertNotIn("bidder", self.get("bids").json()["results"][0])
+        self.assertNotIn("user", self.get("comments").json()["results"][0])
+        self.assertEqual(self.get("bids", fields="amount,bidder").status_code, 400)
+        self.assertEqual(self.get("comments", fields="user").status_code, 400)
+
+        self.client.force_login(self.owner)
+        self.assertEqual(self.get("bids").json()["results"][0]["bidder"], "buyer")
+        self.assertEqual(self.get("comments", fields="user").json()["results"][0]["user"], "buyer")
+
+    def test_bad_requests(self):
+        self.assertEqual(self.get("users").status_code, 404)
+        self.assertEqual(self.get("listings", fields="password").status_code, 400)
+        self.assertEqual(self.get("listings", ids="1,x").status_code, 400)
+        self.assertEqual(self.get("listings", ids=",".join(["1"] * 101)).status_code, 400)
+
+
+class TransferTests(TestCase):
+    def setUp(self):
+        self.owner, self.listing = make_listing()
+        self.buyer = User.objects.create_user("buyer", "buyer@example.com", "password")
+        place_bid(self.buyer, self.listing.id, Decimal("2.00"))
+        place_bid(self.buyer, self.listing.id, Decimal("3.50"))
+        ListingComment.objects.create(user_ID=self.buyer, listing=self.listing, comment="Nice, \"really\"\nnice!")
+        recount_listings()
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def transfer(self, command, model, format, **options):
+        path = os.path.join(self.directory.name, f"{model}.{format}")
+        call_command(command, model, path, stdout=open(os.devnull, "w"), **options)
+        return path
+
+    def test_export_and_import_again(self):
+        models = {"listings": AuctionListing, "bids": Bid, "comments": ListingComment}
+        rows = lambda: [list(model.objects.order_by("id").values()) for model in models.values()]
+
+        for format in ("csv", "jsonl"):
+            with self.subTest(format=format):
+                before = rows()
+                paths = [self.transfer("export_data", name, format, chunk_size=1) for name in models]
+                AuctionListing.objects.all().delete()
+
+                for name, path in zip(models, paths):
+                    call_command("import_data", name, path, stdout=open(os.devnull, "w"), batch_size=1)
+
+                self.assertEqual(rows(), before)
+                self.assertEqual(AuctionListing.objects.get().leading_bid.amount_bid, Decimal("3.50"))
+                self.assertEqual(Category.objects.get(name="Tools").active_count, 1)
+
+    def test_bad_rows_are_reported(self):
+        path = os.path.join(self.directory.name, "bids.csv")
+        with open(path, "w") as file:
+            file.write("listing_id,user_ID_id,amount_bid\n")
+            file.write(f"{self.listing.id},{self.buyer.id},5\n{self.listing.id},x,6\n")
+
+        with self.assertRaisesMessage(CommandError, "Row 2: user_ID_id"):
+            call_command("import_data", "bids", path, batch_size=1)
+
+        # The row before the bad one was saved.
+        self.assertTrue(Bid.objects.filter(amount_bid=5).exists())
+
+    def test_lines_that_arent_json_objects_are_reported(self):
+        path = os.path.join(self.directory.name, "bids.jsonl")
+        for line, message in (("[1, 2]", "Line 2: each line must be a JSON object."), ("{", "Line 2: not valid JSON")):
+            with self.subTest(line=line):
+                with open(path, "w") as file:
+                    file.write(f'{{"listing_id": {self.listing.id}, "user_ID_id": {self.buyer.id}, "amount_bid": 5}}\n')
+                    file.write(line + "\n")
+
+                with self.assertRaisesMessage(CommandError, message):
+                    call_command("import_data", "bids", path, stdout=open(os.devnull, "w"))
+
+
+class ExportAdminTests(TransactionTestCase):
+    def test_streams_every_row(self):
+        owner, listing = make_listing()
+        User.objects.create_superuser("admin", "admin@example.com", "password")
+        self.client.login(username="admin", password="password")
+
+        response = self.client.get(reverse("admin:auctions_auctionlisting_export", args=["jsonl"]))
+
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([(row["id"], row["title"], row["current_price"]) for row in rows], [
+            (listing.id, "Hammer", "1.00")
+        ])
+        self.assertContains(self.client.get(reverse("admin:auctions_auctionlisting_changelist")), "Export CSV")
+
+
+# Makes a PNG image to upload.
+def make_image(width=1000, height=500, name="photo.png"):
+    from PIL import Image
+
+    data = io.BytesIO()
+    Image.new("RGB", (width, height), "red").save(data, "PNG")
+    return SimpleUploadedFile(name, data.getvalue(), content_type="image/png")
+
+
+# Runs an upload through ImageField, as the listing form does.
+def make_image_field(upload):
+    from django import forms
+
+    return forms.ImageField().clean(upload)
+
+
+@skipUnless(UPLOADS_ENABLED, "Pillow isn't installed.")
+class ImageUploadTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.settings = override_settings(MEDIA_ROOT=self.media.name, THUMBNAIL_WORKERS=0)
+        self.settings.enable()
+        self.seller = User.objects.create_user("seller", "seller@example.com", "password")
+        self.client.force_login(self.seller)
+
+    def tearDown(self):
+        self.settings.disable()
+        self.media.cleanup()
+
+    def create_listing(self, **data):
+        return self.client.post(reverse("create_listing"), {
+            "title": "Lamp", "description": "A lamp.", "starting_bid": "5",
+            "category": Category.objects.get(name="Tools").id, **data
+        })
+
+    def test_upload_makes_hashed_thumbnails_for_cards(self):
+        from PIL import Image
+
+        self.create_listing(image=make_image())
+        listing = AuctionListing.objects.get()
+
+        self.assertRegex(listing.image_URL, r"^/media/images/[0-9a-f]{32}\.png$")
+        self.assertTrue(listing.image)
+        self.assertEqual(listing.small_image_URL, f"/media/thumbnails/{listing.image}-small.webp")
+        for size, dimensions in (("small", (300, 150)), ("medium", (600, 300))):
+            with Image.open(os.path.join(self.media.name, "thumbnails", f"{listing.image}-{size}.webp")) as image:
+                self.assertEqual(image.size, dimensions)
+
+        self.assertContains(self.client.get(reverse("index")), listing.small_image_URL)
+
+        response = self.client.get(listing.small_image_URL)
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+        self.assertEqual(response["Content-Type"], "image/webp")
+
+    def test_same_image_is_stored_once(self):
+        first = save_image(make_image_field(make_image()))
+        second = save_image(make_image_field(make_image(name="copy.png")))
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(os.listdir(os.path.join(self.media.name, "images"))), 1)
+
+    def test_needs_an_image_or_a_url(self):
+        response = self.create_listing()
+
+        self.assertContains(response, "Give an image URL or upload an image.")
+        self.assertFalse(AuctionListing.objects.exists())
+
+    def test_rejects_files_that_are_not_images(self):
+        self.create_listing(image=SimpleUploadedFile("photo.png", b"not an image", content_type="image/png"))
+
+        self.assertFalse(AuctionListing.objects.exists())
+
+
+# Makes thumbnails in the worker processes. The listing is updated from another thread, so this can't run inside a
+# test transaction.
+@skipUnless(UPLOADS_ENABLED, "Pillow isn't installed.")
+class ThumbnailWorkerTests(TransactionTestCase):
+    def test_workers_make_thumbnails_in_the_background(self):
+        owner, listing = make_listing()
+        version = listing.version
+
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media, THUMBNAIL_WORKERS=1):
+            digest, name = save_image(make_image_field(make_image()))
+            make_thumbnails_later(listing.id, digest, name)
+
+            deadline = time.monotonic() + 30
+            while not AuctionListing.objects.get(id=listing.id).image and time.monotonic() < deadline:
+                time.sleep(0.1)
+
+            listing = AuctionListing.objects.get(id=listing.id)
+            self.assertEqual(listing.image, digest)
+            self.assertEqual(listing.version, version + 1)
+            self.assertTrue(os.path.exists(os.path.join(media, "thumbnails", f"{digest}-medium.webp")))
+
+
+# Fires thousands of bids at one listing from many threads at once. Each thread uses its own database connection.
+class ConcurrentBidTests(TransactionTestCase):
+    THREADS = 8
+    BIDS_PER_THREAD = 250
+
+    def test_final_price_is_highest_bid(self):
+        owner, listing = make_listing("1.00")
+        bidders = [
+            User.objects.create_user(f"bidder{i}", f"bidder{i}@example.com", "password")
+            for i in range(self.THREADS)
+        ]
+
+        # Every thread gets its own shuffled run of amounts so that low and high bids are interleaved.
+        amounts = [
+            [Decimal(random.randint(200, 999999)) / 100 for _ in range(self.BIDS_PER_THREAD)]
+            for _ in range(self.THREADS)
+        ]
+        start = threading.Barrier(self.THREADS)
+        errors = []
+
+        def bid_many(bidder, thread_amounts):
+            try:
+                start.wait()
+                for amount in thread_amounts:
+                    place_bid(bidder, listing.id, amount)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=bid_many, args=(bidder, thread_amounts))
+            for bidder, thread_amounts in zip(bidders, amounts)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+
+        highest = max(amount for thread_amounts in amounts for amount in thread_amounts)
+        listing.refresh_from_db()
+        self.assertEqual(listing.current_price, highest)
+
+        # Every accepted bid must be higher than the one accepted before it.
+        accepted = list(Bid.objects.filter(listing=listing).order_by("id").values_list("amount_bid", flat=True))
+        self.assertEqual(accepted[-1], highest)
+        self.assertEqual(accepted, sorted(set(accepted)))
+
+
+# Adds a batch of users, listings, bids, comments and watchlist rows in bulk. Calling it again with a new batch
+# number grows the data, so tests can check that a page doesn't get more expensive as the tables get bigger.
+def seed_data(batch, users=20, listings=100, bids=10, comments=10, watched=5):
+    prefix = f"seed{batch}_"
+    User.objects.bulk_create([
+        User(username=f"{prefix}{i}", email=f"{prefix}{i}@example.com", password="!") for i in range(users)
+    ])
+    seeded_users = list(User.objects.filter(username__startswith=prefix))
+    categories = list(Category.objects.all())
+
+    prices = [Decimal(random.randint(100, 100000)) / 100 for _ in range(listings)]
+    AuctionListing.objects.bulk_create([
+        AuctionListing(
+            user_ID=random.choice(seeded_users),
+            title=f"Listing {batch}-{i}",
+            description="A description of the item. " * 20,
+            current_price=price,
+            starting_price=price,
+            image_URL="https://example.com/item.png",
+            category=random.choice(categories),
+            # About a quarter of the listings are closed.
+            status="CLOSED" if i % 4 == 0 else "ACTIVE",
+        )
+        for i, price in enumerate(prices)
+    ])
+    seeded_listings = list(AuctionListing.objects.filter(title__startswith=f"Listing {batch}-"))
+
+    Bid.objects.bulk_create([
+        Bid(user_ID=random.choice(seeded_users), listing=listing, amount_bid=listing.current_price)
+        for listing in seeded_listings for _ in range(bids)
+    ])
+    ListingComment.objects.bulk_create([
+        ListingComment(user_ID=random.choice(seeded_users), listing=listing, comment="A comment.")
+        for listing in seeded_listings for _ in range(comments)
+    ])
+    WatchList.objects.bulk_create([
+        WatchList(user_ID=user, single_listing_watched=listing)
+        for user in seeded_users for listing in random.sample(seeded_listings, watched)
+    ])
+
+
+# Every route in auctions/urls.py, with the most SQL queries it may make. Each entry is:
+# (route name, HTTP method, function that builds the URL and POST data from the test's targets, who is logged in,
+# query budget). A route that goes over its budget, or that makes more queries once there is more data, fails.
+ROUTES = [
+    ("index", "get", lambda t: (reverse("index"), None), "buyer", 5),
+    ("index", "get", lambda t: (reverse("index") + "?sort=price_low&min_price=1", None), "buyer", 5),
+    ("login", "get", lambda t: (reverse("login"), None), None, 0),
+    ("login", "post", lambda t: (reverse("login"), {"username": "buyer", "password": "password"}), None, 9),
+    ("logout", "get", lambda t: (reverse("logout"), None), "buyer", 4),
+    ("register", "get", lambda t: (reverse("register"), None), None, 0),
+    ("register", "post", lambda t: (reverse("register"), {
+        "username": t["new_user"], "email": "new@example.com", "password": "password", "confirmation": "password"
+    }), None, 10),
+    ("create_listing", "get", lambda t: (reverse("create_listing"), None), "seller", 4),
+    ("create_listing", "post", lambda t: (reverse("create_listing"), {
+        "title": "New", "description": "New item.", "starting_bid": "5", "image_URL": "https://example.com/new.png",
+        "category": t["category"], "duration": "7"
+    }), "seller", 8),
+    ("get_listing", "get", lambda t: (reverse("get_listing", args=[t["listing"]]), None), "buyer", 5),
+    ("add_listing", "post", lambda t: (reverse("add_listing", args=[t["listing"]]), None), "buyer", 7),
+    ("remove", "post", lambda t: (reverse("remove", args=[t["listing"]]), None), "buyer", 7),
+    ("bid", "post", lambda t: (reverse("bid", args=[t["listing"]]), {"bid": t["bid"]}), "buyer", 12),
+    ("comment", "post", lambda t: (reverse("comment", args=[t["listing"]]), {"textarea": "Nice!"}), "buyer", 7),
+    ("close", "post", lambda t: (reverse("close", args=[t["listing"]]), None), "seller", 9),
+    ("listing_events", "get", lambda t: (reverse("listing_events", args=[t["listing"]]), None), "buyer", 0),
+    ("static", "get", lambda t: (reverse("static", args=["auctions/styles.css"]), None), None, 0),
+    ("media", "get", lambda t: (reverse("media", args=["item.png"]), None), None, 0),
+    ("watchlist", "get", lambda t: (reverse("watchlist"), None), "buyer", 4),
+    ("profiling", "get", lambda t: (reverse("profiling"), None), "buyer", 2),
+    ("api", "get", lambda t: (reverse("api", args=["listings"]) + "?ids=%d" % t["listing"], None), None, 1),
+    ("leaderboards", "get", lambda t: (reverse("leaderboards"), None), None, 5),
+    ("search", "get", lambda t: (reverse("search") + "?q=description", None), None, 2),
+    ("categories", "get", lambda t: (reverse("categories"), None), None, 1),
+    ("category_listings", "get", lambda t: (reverse("category_listings", args=["Food"]), None), None, 2),
+    ("category_listings", "get", lambda t: (
+        reverse("category_listings", args=["Food"]) + "?sort=price_high&max_price=500", None
+    ), None, 2),
+]
+
+
+# Hits every route with a small amount of seeded data, then again after the data has grown several times over,
+# recording the number of SQL queries and the time each request takes. Set ROUTE_REPORT=1 in the environment to
+# print the numbers.
+class ReadViewTests(TestCase):
+    # Django 3.1 already runs sync views in a thread under ASGI, so the read-heavy pages stay sync rather than being
+    # wrapped in async views that do the same.
+    def test_read_heavy_pages_are_sync_views(self):
+        for view in (views.index, views.category_listings, views.get_listing, views.watchlist):
+            with self.subTest(view=view.__name__):
+                self.assertFalse(asyncio.iscoroutinefunction(view))
+
+
+class RouteQueryBudgetTests(TestCase):
+    GROWTH_BATCHES = 4
+
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", "seller@example.com", "password")
+        self.buyer = User.objects.create_user("buyer", "buyer@example.com", "password")
+        self.report = []
+
+        # A static file and an uploaded image for the static and media routes to send.
+        files = tempfile.TemporaryDirectory()
+        self.addCleanup(files.cleanup)
+        for name in ("static/auctions/styles.css", "media/item.png"):
+            os.makedirs(os.path.dirname(os.path.join(files.name, name)), exist_ok=True)
+            with open(os.path.join(files.name, name), "w") as file:
+                file.write("body {}")
+        settings = override_settings(
+            STATIC_ROOT=os.path.join(files.name, "static"), MEDIA_ROOT=os.path.join(files.name, "media")
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    # Makes a fresh active listing owned by the seller, with bids and comments that grow with the data.
+    def targets(self, batch):
+        listing = AuctionListing.objects.create(
+            user_ID=self.seller,
+            title=f"Target {batch}",
+            description="The listing the routes are tested against.",
+            current_price=Decimal("10.00"),
+            image_URL="https://example.com/target.png",
+            category=Category.objects.get(name="Food"),
+        )
+        ListingComment.objects.bulk_create([
+            ListingComment(user_ID=self.buyer, listing=listing, comment="A comment.") for _ in range(50 * batch)
+        ])
+        for amount in range(11, 11 + 10 * batch):
+            place_bid(self.seller if amount % 2 else self.buyer, listing.id, Decimal(amount))
+
+        return {
+            "listing": listing.id,
+            "category": listing.category_id,
+            "new_user": f"newuser{batch}",
+            "bid": str(10000 + batch),
+        }
+
+    # Runs every route once and returns the number of queries each one made.
+    def run_routes(self, batch):
+        targets = self.targets(batch)
+        users = {"buyer": self.buyer, "seller": self.seller}
+        counts = []
+
+        for name, method, build, user, budget in ROUTES:
+            self.client.logout()
+            if user:
+                self.client.force_login(users[user])
+            url, data = build(targets)
+            # Every route is measured with an empty cache, which is when it makes the most queries.
+            cache.clear()
+
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = getattr(self.client, method)(url, data or {})
+                elapsed = time.perf_counter() - start
+
+            self.assertLess(response.status_code, 400, f"{method.upper()} {name}")
+            self.assertLessEqual(len(queries), budget, f"{method.upper()} {name} went over its query budget")
+            counts.append(len(queries))
+            self.report.append((batch, name, method, len(queries), elapsed))
+
+        return counts
+
+    def test_every_route_has_a_budget(self):
+        self.assertEqual({route[0] for route in ROUTES}, {pattern.name for pattern in urlpatterns})
+
+    def test_query_counts_stay_within_budget_and_flat(self):
+        seed_data(0)
+        baseline = self.run_routes(1)
+
+        for batch in range(1, self.GROWTH_BATCHES + 1):
+            seed_data(batch)
+        grown = self.run_routes(self.GROWTH_BATCHES + 1)
+
+        for (name, method, *_), before, after in zip(ROUTES, baseline, grown):
+            self.assertEqual(before, after, f"{method.upper()} {name} makes more queries with more data")
+
+    def tearDown(self):
+        if os.environ.get("ROUTE_REPORT"):
+            print()
+            print(f"{'batch':>5}  {'route':<18} {'method':<6} {'queries':>7} {'ms':>8}")
+            for batch, name, method, queries, elapsed in self.report:
+                print(f"{batch:>5}  {name:<18} {method:<6} {queries:>7} {elapsed * 1000:>8.1f}")
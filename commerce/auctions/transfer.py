@@ -0,0 +1,227 @@
+# Bulk import and export of listings, bids and comments, as CSV or JSON Lines (one JSON object per line).
+#
+# Both directions stream: an import reads one row at a time and saves them with bulk_create a batch at a time, and an
+# export reads rows from a server-side cursor a chunk at a time, so memory use stays the same however many rows there
+# are. The columns are the models' own database columns (e.g. "user_ID_id", "listing_id"), so an export can be
+# imported again as it is, as long as the users it refers to exist.
+
+import csv
+import io
+import json
+import queue
+import threading
+
+from django.core.exceptions import ValidationError
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, connections, reset_queries, transaction
+from django.db.models import Exists, OuterRef, Subquery
+
+from .bidding import recount_categories
+from .counters import recount_listings, update_in_batches
+from .models import Category, AuctionListing, Bid, ListingComment
+
+
+# The models that can be imported and exported, in the order they have to be imported in.
+MODELS = {
+    "listings": AuctionListing,
+    "bids": Bid,
+    "comments": ListingComment,
+}
+
+FORMATS = ("csv", "jsonl")
+
+# The number of rows saved per INSERT, and read per chunk when exporting.
+BATCH_SIZE = 2000
+
+
+# Raised for a file that can't be imported, with a message saying where and why.
+class TransferError(ValueError):
+    pass
+
+
+# Returns the format of a file from its name, unless one was given.
+def format_of(path, given=None):
+    if given:
+        return given
+    for name in FORMATS:
+        if path.endswith("." + name):
+            return name
+    raise TransferError(f"Can't tell the format of {path}; use one of: {', '.join(FORMATS)}.")
+
+
+# The columns of a model, in table order.
+def columns(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+# Yields the rows of a model, in primary key order, as CSV (with a header row) or JSON Lines. Rows are read through
+# a server-side cursor chunk_size at a time, and each chunk of rows is yielded as one string.
+def export_chunks(model, format, chunk_size=BATCH_SIZE):
+    names = columns(model)
+    rows = model.objects.order_by("pk").values_list(*names).iterator(chunk_size=chunk_size)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if format == "csv":
+        writer.writerow(names)
+
+    count = 0
+    for row in rows:
+        if format == "csv":
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(dict(zip(names, row)), cls=DjangoJSONEncoder) + "\n")
+
+        count += 1
+        if count % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+# Marks the end of the chunks passed from in_thread()'s reader thread.
+_DONE = object()
+
+
+# Runs an iterator that reads from the database in a thread of its own, yielding what it produces. Django 3.1's
+# ASGI handler reads a streaming response on the event loop, where queries aren't allowed, so the admin download
+# is read this way. At most a few chunks are held at once, and the thread stops if the download is abandoned.
+def in_thread(make_iterator, size=4):
+    chunks = queue.Queue(size)
+    stop = threading.Event()
+
+    # Waits for room to pass on an item, giving up if the reader has gone away. Returns whether it was passed on.
+    def put(item):
+        while not stop.is_set():
+            try:
+                chunks.put(item, timeout=1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for chunk in make_iterator():
+                if not put(chunk):
+                    return
+            put(_DONE)
+        except Exception as error:
+            put(error)
+        finally:
+            connections.close_all()
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item = chunks.get()
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+# Yields the rows of a CSV or JSON Lines file as dicts, one at a time. A JSON Lines line that isn't a JSON object is
+# reported with its line number.
+def read_rows(stream, format):
+    if format == "csv":
+        yield from csv.DictReader(stream)
+        return
+
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            raise TransferError(f"Line {number}: not valid JSON: {error}")
+        if not isinstance(row, dict):
+            raise TransferError(f"Line {number}: each line must be a JSON object.")
+        yield row
+
+
+# Turns one value from a file into the value saved for a field. An empty value is saved as NULL if the field allows
+# it, and otherwise leaves the field at its default.
+def parse_value(field, value):
+    if value is None or value == "":
+        return None if field.null else field.get_default()
+    return field.to_python(value)
+
+
+# Saves rows (dicts from read_rows()) as instances of model, batch_size at a time, each batch in its own transaction.
+# Rows are checked and converted as they are read, so a bad row is reported with its row number; the batches before
+# it stay saved. Returns the number of rows saved.
+def import_rows(model, rows, batch_size=BATCH_SIZE):
+    fields = {field.attname: field for field in model._meta.concrete_fields}
+    total = 0
+    batch = []
+
+    for number, row in enumerate(rows, 1):
+        values = {}
+        for name, value in row.items():
+            if name not in fields:
+                raise TransferError(f"Row {number}: {model._meta.verbose_name} has no column {name!r}.")
+            try:
+                values[name] = parse_value(fields[name], value)
+            except ValidationError as error:
+                raise TransferError(f"Row {number}: {name}: {' '.join(error.messages)}")
+
+        # The bids a listing's leading_bid points at are imported after the listing, so it's filled in afterwards
+        # (see finish_import()). Files exported before listings had a starting price start them at their current one.
+        if model is AuctionListing:
+            values["leading_bid_id"] = None
+            if values.get("starting_price") is None:
+                values["starting_price"] = values.get("current_price")
+
+        batch.append(model(**values))
+        if len(batch) == batch_size:
+            total += _save(model, batch)
+            batch = []
+
+    if batch:
+        total += _save(model, batch)
+
+    return total
+
+
+# Saves one batch of rows in its own transaction and returns how many there were.
+def _save(model, batch):
+    with transaction.atomic():
+        model.objects.bulk_create(batch)
+
+    # With DEBUG on, Django keeps the SQL of every query, and each INSERT holds a whole batch.
+    reset_queries()
+    return len(batch)
+
+
+# Brings everything that depends on the imported rows up to date, with set-based queries: the database's ID
+# sequence (so new rows don't reuse imported IDs), the categories' active listing counts after listings are
+# imported, each listing's leading bid after bids are imported, and the listings' activity counts after bids or
+# comments are imported. Everything but the sequence is updated a batch of rows at a time (see update_in_batches),
+# so a large import doesn't end with one long write.
+def finish_import(model):
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [model]):
+                cursor.execute(sql)
+
+    if model is AuctionListing:
+        update_in_batches(Category, recount_categories)
+
+    if model is Bid:
+        bids = Bid.objects.filter(listing=OuterRef("id"))
+        highest = bids.order_by("-amount_bid", "id")
+        update_in_batches(AuctionListing, lambda batch: batch.filter(Exists(bids), leading_bid__isnull=True).update(
+            leading_bid=Subquery(highest.values("id")[:1]),
+            leading_bidder=Subquery(highest.values("user_ID")[:1]),
+        ))
+        recount_listings(["bid_count"])
+    if model is ListingComment:
+        recount_listings(["comment_count"])
@@ -25,8 +25,22 @@ urlpatterns = [
     path("<int:listing_id>/close", views.close, name="close"),
     # Enables comments.
     path("<int:listing_id>/comment", views.comment, name="comment"),
+    # Live updates (Server-Sent Events) for a listing page.
+    path("<int:listing_id>/events", views.listing_events, name="listing_events"),
+    # Static files collected by collectstatic.
+    path("static/<path:path>", views.static, name="static"),
+    # Uploaded images and their thumbnails.
+    path("media/<path:path>", views.media, name="media"),
+    # Request profiling, for staff.
+    path("profiling", views.profiling, name="profiling"),
+    # The JSON API for listings, bids and comments.
+    path("api/<str:resource>", views.api, name="api"),
     # Get a user's watchlist.
     path("watchlist", views.watchlist, name="watchlist"),
+    # The most active listings.
+    path("leaderboards", views.leaderboards, name="leaderboards"),
+    # Search active listings.
+    path("search", views.search, name="search"),
     # Displays a page with listing categories.
     path("categories", views.categories, name="categories"),
     # Get all active listings for a particular category.
@@ -1,10 +1,29 @@
+from datetime import timedelta
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import authenticate, login, logout
-from django.db import IntegrityError
-from django.http import HttpResponse, HttpResponseRedirect
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.http import Http404, HttpResponse, HttpResponseRedirect, JsonResponse
 from django.shortcuts import render
 from django.urls import reverse
-
-from .models import User, AuctionListing, WatchList, Bid, ListingComment
+from django.utils import timezone
+from django.views.static import serve
+
+from .models import User, Category, AuctionListing, WatchList, ListingComment
+from .api import RESOURCES, ApiError, query
+from .bidding import place_bid, close_listing
+from .cards import CARD_KEY_FIELDS, listing_cards
+from .images import MAX_UPLOAD_SIZE, UPLOADS_ENABLED, make_thumbnails_later, save_image
+from .leaderboards import BOARDS, cached_leaderboards
+from .live import publish
+from .pagination import keyset_page
+from .profiling import summary
+from .search import search_listings
+from .sqlite import read_only
+from .staticfiles import serve_static
 
 from django.contrib.auth.decorators import login_required
 from django import forms
@@ -15,26 +34,45 @@ from django import forms
 #####################################
 
 
+# The lengths of time (in days) an auction can run for.
+DURATIONS = [
+    ("", "Until I close it"),
+    (1, "1 day"),
+    (3, "3 days"),
+    (7, "7 days"),
+    (14, "14 days"),
+]
+
+
 # A form that creates a blank form for a user to create a new listing.
 class ListingForm(forms.Form):
     title = forms.CharField(max_length=100)
     description = forms.CharField(widget=forms.Textarea())
     starting_bid = forms.DecimalField(min_value=0)
-    image_URL = forms.URLField(max_length=200)
-
-    # Tuples of categories a user can choose from when they create a listing.
-    CATEGORIES = (
-        ("1", "Food"),
-        ("2", "Home Appliances"),
-        ("3", "Health"),
-        ("4", "Tools"),
-        ("5", "Books"),
-        ("6", "Entertainment"),
-        ("7", "Clothing"),
-        ("8", "Sporting Goods")
-    )
-
-    category = forms.ChoiceField(choices=CATEGORIES)
+    # A listing either links to an image or has one uploaded (if Pillow is installed, see images.py).
+    image_URL = forms.URLField(max_length=200, required=False)
+    image = forms.ImageField(required=False)
+    # The categories a user can choose from when they create a listing come from the Category table.
+    category = forms.ModelChoiceField(queryset=Category.objects.all())
+    # How long the auction runs before it closes by itself. Without one, only the owner can close it.
+    duration = forms.TypedChoiceField(choices=DURATIONS, coerce=int, empty_value=None, required=False)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not UPLOADS_ENABLED:
+            del self.fields["image"]
+
+    def clean_image(self):
+        image = self.cleaned_data["image"]
+        if image and image.size > MAX_UPLOAD_SIZE:
+            raise forms.ValidationError("Images can be at most %d MB." % (MAX_UPLOAD_SIZE // (1024 * 1024)))
+        return image
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get("image_URL") and not cleaned_data.get("image") and not self.errors:
+            raise forms.ValidationError("Give an image URL or upload an image.")
+        return cleaned_data
 
 
 # A form for making bids.
@@ -42,24 +80,52 @@ class BidForm(forms.Form):
     bid = forms.DecimalField(min_value=0)
 
 
+# The orders listings can be browsed in, with the fields each one sorts by. The last field is always the ID, so that
+# listings with the same price stay in the same order from page to page.
+SORTS = {
+    "newest": ("-id",),
+    "price_low": ("current_price", "id"),
+    "price_high": ("-current_price", "-id"),
+}
+
+
+# A form for the order and price range of the listings on the homepage and category pages. It is filled in from the
+# query string, and anything that isn't valid is left out.
+class BrowseForm(forms.Form):
+    sort = forms.ChoiceField(choices=[
+        ("newest", "Newest first"),
+        ("price_low", "Price: low to high"),
+        ("price_high", "Price: high to low"),
+    ], required=False)
+    min_price = forms.DecimalField(min_value=0, max_digits=8, decimal_places=2, required=False)
+    max_price = forms.DecimalField(min_value=0, max_digits=8, decimal_places=2, required=False)
+
+
 #########################################
 ############### Functions ###############
 #########################################
 
 
-# Renders all active listings on the homepage.
+# Renders all active listings on the homepage, one page at a time.
+# This and the other read-heavy pages are normal (sync) views. In Django 3.1 the ORM and templates only run
+# synchronously, so an async view would have to hand all of its work to a thread with sync_to_async, which is what
+# Django's ASGI handler already does for a sync view. It wouldn't let more requests run at once, and under WSGI it
+# would add an event loop to every request.
+@read_only
 def index(request):
-    all_listings = AuctionListing.objects.all()
-    listings = []
-
-    for row in all_listings:
-        # If the listing isn't closed, we will add it to the list of listings to be returned to the user.
-        # The listing will still be available for a user to view if they have saved it to their watchlist.
-        if not is_closed(row):
-            listings.append(row)
-            
+    # Only active listings are shown. Closed listings will still be available for a user to view if they
+    # have saved them to their watchlist. The filter is done by the database using the indexes that start with status.
+    active_listings = AuctionListing.objects.filter(status="ACTIVE")
+
+    # Newest listings first, unless the user chose another order or a price range.
+    form, listings, next_cursor = browse_page(request, active_listings)
+    cards = listing_cards(listings)
+
     return render(request, "auctions/index.html", {
-        "listings": listings
+        "form": form,
+        "cards": cards,
+        "next_cursor": next_cursor,
+        "browse_query": browse_query(form)
     })
 
 
@@ -112,53 +178,60 @@ def register(request):
             return render(request, "auctions/register.html", {
                 "message": "Username already taken."
             })
-        login(request, user)
+        # There is more than one authentication backend (see settings.py), so say which one the new user logs in with.
+        login(request, user, backend="auctions.backends.CachedModelBackend")
         return HttpResponseRedirect(reverse("index"))
     else:
         return render(request, "auctions/register.html")
 
 
-# Returns a page that shows all listings in a category, as well as the title of the category.
+# Returns a page that shows all active listings in a category, as well as the title of the category.
+@read_only
 def category_listings(request, category):
-    all_listings = AuctionListing.objects.all()
-    listings = []
-
-    for row in all_listings:
-        category_field = row.category
-        # If the listing isn't closed and the category passed in is equivalent to this row's category field, we will add 
-        # it to the list of listings to be returned to the user.
-        if not is_closed(row) and category_field == category:
-            listings.append(row)
-            
+    # The (category, status) index lets the database find just this category's active listings, newest first, and the
+    # (status, category, current_price) index does the same in price order.
+    active_listings = AuctionListing.objects.filter(category__name=category, status="ACTIVE")
+    form, listings, next_cursor = browse_page(request, active_listings)
+    cards = listing_cards(listings)
+
     return render(request, "auctions/category_listings.html", {
         "category": category,
-        "listings": listings
+        "form": form,
+        "cards": cards,
+        "next_cursor": next_cursor,
+        "browse_query": browse_query(form)
     })
 
 
-# Returns a list of clickable listing category links to the user.
+# Returns a list of clickable listing category links to the user, along with how many active
+# listings each category has.
+@read_only
 def categories(request):
-    categories = [
-        "Food",
-        "Home Appliances",
-        "Health",
-        "Tools",
-        "Books",
-        "Entertainment",
-        "Clothing",
-        "Sporting Goods"
-    ]
-    
+    categories = Category.objects.all()
+
     return render (request, "auctions/categories.html", {
         "categories": categories
     })
 
 
+# Returns a page of active listings that match the words the user searched for, best matches first.
+@read_only
+def search(request):
+    q = request.GET.get("q", "")
+    listings, next_cursor = search_listings(q, request.GET.get("cursor"))
+
+    return render(request, "auctions/search.html", {
+        "q": q,
+        "cards": listing_cards(listings),
+        "next_cursor": next_cursor
+    })
+
+
 # Renders a page that allows the user to create a new listing.
 @login_required
 def create_listing(request):
     if request.method == "POST":
-        form = ListingForm(request.POST)
+        form = ListingForm(request.POST, request.FILES)
         if form.is_valid():
             # Get current user.
             user_ID = request.user
@@ -168,9 +241,9 @@ def create_listing(request):
             description = form.cleaned_data["description"]
             current_price = form.cleaned_data["starting_bid"]
             image_URL = form.cleaned_data["image_URL"]
+            image = form.cleaned_data.get("image")
             category = form.cleaned_data["category"]
-            # Make sure we have the English-language category and not just its number. I.E., "food" instead of "3".
-            category = dict(form.fields["category"].choices)[category]
+            duration = form.cleaned_data["duration"]
             
             # Instantiate a row that will contain the listing's data in our AuctionListing table.
             listing = AuctionListing()
@@ -181,100 +254,63 @@ def create_listing(request):
             listing.current_price = current_price
             listing.image_URL = image_URL
             listing.category = category
+            # An uploaded image is saved under a name made from its contents, and shown until its thumbnails are ready.
+            if image:
+                digest, name = save_image(image)
+                listing.image_URL = settings.MEDIA_URL + name
             # Set the status of the item to ACTIVE.
             listing.status = "ACTIVE"
-            # Save the row to the table.
+            # Set when the auction ends, if the user chose a duration.
+            if duration:
+                listing.ends_at = timezone.now() + timedelta(days=duration)
+
+            # Save the row to the table (which counts it in its category's active listings).
             listing.save()
 
+            # Make the thumbnails once the listing is saved, without making the user wait for them.
+            if image:
+                make_thumbnails_later(listing.id, digest, name)
+
             return render(request, "auctions/success.html")
 
-    # GET a blank listing form.
-    form = ListingForm()
+    else:
+        # GET a blank listing form.
+        form = ListingForm()
+
+    # Show the form (again, with its errors, if what was submitted wasn't valid).
     return render (request, "auctions/create_listing.html", {
         "form": form
     })
 
 
 # Gets a specific listing to display to the user.
+@read_only
 def get_listing(request, listing_id):
-    # See if currently logged-in user is the owner of the listing. If they are, the "Add to watchlist" button
-    # will not be displayed.
-    not_owner = is_owner(request, listing_id)
-    # See if user needs the Remove button. If they do, we will return it the HTML.
-    remove = watched(request, listing_id)
-
     # Send all listing information to listing.html for GET request. Dependent on ID that is passed in.
-    listing = AuctionListing.objects.get(id=listing_id)
-
-    closed = is_closed(listing)
-    comments = ListingComment.objects.all()
+    return render(request, "auctions/listing.html", listing_context(request, listing_id))
 
-    listing_comments = []
-    for comment in comments:
-        if comment.listing == listing:
-            listing_comments.append(comment)
-
-    return render (request, "auctions/listing.html", {
-        "not_owner": not_owner,
-        "remove": remove,
-        "image_URL": listing.image_URL,
-        "id": listing.id,
-        "poster": listing.user_ID,
-        "title": listing.title,
-        "description": listing.description,
-        "price": listing.current_price,
-        "category": listing.category,
-        "status": listing.status,
-        "closed": closed,
-        "winner": listing.winner,
-        "comments": listing_comments
-    })
-    
 
 # Adds a listing to a user's watchlist.
 @login_required
 def add_listing(request, listing_id):
-    # Send all listing information to listing.html for GET request.
-    # Dependent on ID that is passed in.
-    listing = AuctionListing.objects.get(id=listing_id)
     user = request.user
 
-    # Add listing to user's watchlist.
-    # Create a row that will be part of the watchlist for this user.
-    watchlist = WatchList()
-    watchlist.user_ID = user
-    # The listing ID that was passed in.
-    watchlist.single_listing_watched = AuctionListing.objects.get(pk=listing_id)
-    watchlist.save()
+    # Add listing to user's watchlist, unless it's already there.
+    # Create a row that will be part of the watchlist for this user, and count the listing's new watcher with it.
+    # The unique constraint on (user_ID, single_listing_watched) means a row added by another request in the
+    # meantime is kept instead (INSERT OR IGNORE), so there's no error to recover from and no savepoint is needed,
+    # and the listing's watchers are only counted if this request's row was actually inserted.
+    if not watched(request, listing_id):
+        with transaction.atomic(savepoint=False):
+            if add_watcher(user, listing_id):
+                count_watchers(listing_id, 1)
+        watched_ids(request).add(listing_id)
 
-    # Render the remove button to the HTML once the user adds the listing to their watchlist.
-    remove = watched(request, listing_id)
-    closed = is_closed(listing)
-    not_owner = is_owner(request, listing_id)
-    comments = ListingComment.objects.all()
-
-    listing_comments = []
-    for comment in comments:
-        if comment.listing == listing:
-            listing_comments.append(comment)
-
-    # Return GET page signifying that the listing was added to the user's watchlist. 
-    return render (request, "auctions/listing.html", {
-        "remove": remove,
-        "not_owner": not_owner,
-        "added": "Successfully added to watchlist!",
-        "image_URL": listing.image_URL,
-        "id": listing.id,
-        "poster": listing.user_ID,
-        "title": listing.title,
-        "description": listing.description,
-        "price": listing.current_price,
-        "category": listing.category,
-        "status": listing.status,
-        "closed": closed,
-        "winner": listing.winner,
-        "comments": listing_comments
-    })
+    # Return GET page signifying that the listing was added to the user's watchlist. The remove button is
+    # rendered to the HTML now that the user has added the listing to their watchlist.
+    return render (request, "auctions/listing.html", listing_context(request, listing_id,
+        added="Successfully added to watchlist!"
+    ))
 
 
 # Removes a listing from the user's watchlist and returns the GET page.
@@ -287,262 +323,100 @@ def remove(request, listing_id):
     user = request.user
     # If remove variable is set to true, then we remove the listing from a user's watchlist
     # when the user clicks the button. The user is then sent back to the GET page.
+    # The listing's watcher count only goes down if a row was actually deleted.
     if remove:
-        for row in WatchList.objects.all():
-            if row.user_ID == user and row.single_listing_watched.id == listing_id:
-                primary_key = row.id
-                WatchList.objects.filter(id=primary_key).delete()
+        with transaction.atomic(savepoint=False):
+            deleted, _ = WatchList.objects.filter(user_ID=user, single_listing_watched_id=listing_id).delete()
+            if deleted:
+                count_watchers(listing_id, -1)
+        watched_ids(request).discard(listing_id)
 
-    return get_listing(request, listing_id)
+    return render (request, "auctions/listing.html", listing_context(request, listing_id))
 
 
 # A function that allows a logged-in user to make a bid on a listing.
 @login_required
 def bid(request, listing_id):
+    if request.method == "POST":
+        form = BidForm(request.POST)
+        if form.is_valid():
+            # Get current user.
+            user = request.user
+
+            # Get the submitted bid int.
+            amount = form.cleaned_data["bid"]
+
+            # Record the bid and raise the listing's price in one step. place_bid() only succeeds if the amount
+            # is still greater than the current price at the moment the database applies it, so a lower bid
+            # can never overwrite a higher one that came in at the same time.
+            # If it was less than or equal to the current listing price, we pass back an error message with the
+            # rest of the HTML page. Otherwise, we display the new amount along with a success message.
+            not_enough = place_bid(user, listing_id, amount) is None
+
+            # Let everyone watching the listing's page see the new price.
+            if not not_enough:
+                publish(listing_id, "bid", {"price": f"{amount:.2f}", "bidder": user.username})
+
+            return render (request, "auctions/listing.html", listing_context(request, listing_id,
+                not_enough=not_enough,
+                updated=not not_enough
+            ))
+
+        # If nothing entered in the form, return warning to user.
+        return render (request, "auctions/listing.html", listing_context(request, listing_id,
+            not_enough=True
+        ))
+
+    return render (request, "auctions/listing.html", listing_context(request, listing_id))
 
-    listing = AuctionListing.objects.get(id=listing_id)
-    comments = ListingComment.objects.all()
-
-    listing_comments = []
-    for comment in comments:
-        if comment.listing == listing:
-            listing_comments.append(comment)
-
-    if request.user.is_authenticated:
-        if request.method == "POST":
-            form = BidForm(request.POST)
-            if form.is_valid():
-                # Get current user.
-                user = request.user
-
-                # Get the submitted bid int.
-                amount = form.cleaned_data["bid"]
-
-                # Check to see that the amount passed in is greater than the current listing price.
-                # If it less than or equal to the current listing price, we pass back an error message with the
-                # rest of the HTML page and its required variables.
-                not_enough = enough(amount, listing_id)
-                not_owner = is_owner(request, listing_id)
-                remove = watched(request, listing_id)
-                closed = is_closed(listing)
-
-                if not_enough:
-                    return render (request, "auctions/listing.html", {
-                        "not_owner": not_owner,
-                        "remove": remove,
-                        "not_enough": not_enough,
-                        "image_URL": listing.image_URL,
-                        "id": listing.id,
-                        "poster": listing.user_ID,
-                        "title": listing.title,
-                        "description": listing.description,
-                        "price": listing.current_price,
-                        "category": listing.category,
-                        "status": listing.status,
-                        "closed": closed,
-                        "comments": listing_comments
-                    })
-                
-                # Otherwise, the amount is greater than the current listing price, so we put a record of it
-                # in our Bid table and change the current price to this bid price in our AuctionListings table.
-                # This bid will be greater than any other bid in the table for this listing by necessity of it 
-                # having to be larger than the current price.
-                # Add new row to bids table for this bid.
-                bid = Bid()
-                bid.user_ID = user
-                # The listing ID that was passed in.
-                bid.listing = AuctionListing.objects.get(pk=listing_id) 
-                # Amount bid.
-                bid.amount_bid = amount
-                bid.save()
-                # Change the current_price of this listing to the bid amount and display the new amount,
-                # along with a success message.
-                listing.current_price = amount
-                listing.save(update_fields=['current_price'])
-
-                # Ensure the table was updated and return the HTML page.
-                if listing.current_price == amount:
-                    updated = True
-
-                    closed = is_closed(listing)
-                
-                    return render (request, "auctions/listing.html", {
-                            "updated": updated,
-                            "not_owner": not_owner,
-                            "remove": remove,
-                            "not_enough": not_enough,
-                            "image_URL": listing.image_URL,
-                            "id": listing.id,
-                            "poster": listing.user_ID,
-                            "title": listing.title,
-                            "description": listing.description,
-                            "price": listing.current_price,
-                            "category": listing.category,
-                            "status": listing.status,
-                            "closed": closed,
-                            "winner": listing.winner,
-                            "comments": listing_comments
-                        })
-            # If nothing entered in the form, set amount from None to zero, and return warning to user.
-            else:
-                amount = 0
-                not_enough = enough(amount, listing_id)
-                listing = AuctionListing.objects.get(id=listing_id)
-                not_owner = is_owner(request, listing_id)
-                remove = watched(request, listing_id)
-                closed = is_closed(listing)
-                if not_enough:
-                    return render (request, "auctions/listing.html", {
-                        "not_owner": not_owner,
-                        "remove": remove,
-                        "not_enough": not_enough,
-                        "image_URL": listing.image_URL,
-                        "id": listing.id,
-                        "poster": listing.user_ID,
-                        "title": listing.title,
-                        "description": listing.description,
-                        "price": listing.current_price,
-                        "category": listing.category,
-                        "status": listing.status,
-                        "closed": closed,
-                        "comments": listing_comments
-                    })
-  
 
 # Allows owner to close their listing and announce the highest bidder as the winner.
 @login_required
 def close(request, listing_id):
-    # Set the status of this listing to CLOSED in AuctionListings table.
-    listing = AuctionListing.objects.get(id=listing_id)
-    listing.status = "CLOSED"
-    listing.save(update_fields=['status'])
+    # Set the status of this listing to CLOSED in AuctionListings table. The listing's leading bidder (if
+    # anyone has bid on it) becomes the winner. If no one has bid on the listing yet, the owner can close it anyway.
+    closed = close_listing(listing_id)
+    context = listing_context(request, listing_id)
 
-    not_owner = is_owner(request, listing_id)
-    remove = watched(request, listing_id)
-    closed = is_closed(listing)
-    comments = ListingComment.objects.all()
-
-    listing_comments = []
-    for comment in comments:
-        if comment.listing == listing:
-            listing_comments.append(comment)
-
-    # Fetch the highest bidder based on the highest bid in the bids table.
-    listing_bids = []
-    for row in Bid.objects.all():
-        if row.listing == listing:
-            listing_bids.append(row.amount_bid)
-    
-    # If no one has bid on the listing yet, allow the owner to close the listing anyway.
-    if len(listing_bids) == 0:
-        return render (request, "auctions/listing.html", {
-            "winner": listing.winner,
-            "closed": closed,
-            "not_owner": not_owner,
-            "remove": remove,
-            "image_URL": listing.image_URL,
-            "id": listing.id,
-            "poster": listing.user_ID,
-            "title": listing.title,
-            "description": listing.description,
-            "price": listing.current_price,
-            "category": listing.category,
-            "status": listing.status,
-            "comments": listing_comments
-        })
-
-    listing_bids.sort(reverse=True)
-
-    # Select the winning bid, and find the user who has that bid amount for this listing.
-    winning_bid = listing_bids[0]
-    for row in Bid.objects.all():
-        if row.listing == listing and row.amount_bid == winning_bid:
-            winner = str(row.user_ID)
-    
-    # Update the listing's row in the DB with the winner.
-    listing.winner = winner
-    listing.save(update_fields=['winner'])
-
-    return render (request, "auctions/listing.html", {
-        "winner": listing.winner,
-        "closed": closed,
-        "not_owner": not_owner,
-        "remove": remove,
-        "image_URL": listing.image_URL,
-        "id": listing.id,
-        "poster": listing.user_ID,
-        "title": listing.title,
-        "description": listing.description,
-        "price": listing.current_price,
-        "category": listing.category,
-        "status": listing.status,
-    })
+    # Let everyone watching the listing's page know that it's closed and who won.
+    if closed:
+        winner = context["winner"]
+        publish(listing_id, "close", {"winner": winner.username if winner else None})
+
+    return render (request, "auctions/listing.html", context)
 
 
 # Enables the logged-in user to make a comment on a listing and returns updated comments.
 @login_required
 def comment(request, listing_id):
-    comments = ListingComment.objects.all()
-    listing = AuctionListing.objects.get(id=listing_id)
-    not_owner = is_owner(request, listing_id)
-    remove = watched(request, listing_id)
-    closed = is_closed(listing)
-
     if request.method == "POST":
-            # Get current user.
-            user_ID = request.user
-
-            # Get cleaned-up data fields from the submitted form.
-            comment_text = request.POST.get('textarea')
-            
-            # Instantiate and populate a row that will contain the comment's data in our ListingComment table.
-            comment = ListingComment()
-            comment.user_ID = user_ID
-            comment.listing = listing
-            comment.comment = comment_text
+        # Get current user.
+        user_ID = request.user
+
+        # Get cleaned-up data fields from the submitted form.
+        comment_text = request.POST.get('textarea')
+
+        # Instantiate and populate a row that will contain the comment's data in our ListingComment table.
+        comment = ListingComment()
+        comment.user_ID = user_ID
+        comment.listing_id = listing_id
+        comment.comment = comment_text
+        # Save the comment and count it on the listing together.
+        with transaction.atomic(savepoint=False):
             comment.save()
+            count_comment(listing_id)
 
-            listing_comments = []
-            for comment in comments:
-                if comment.listing == listing:
-                    listing_comments.append(comment)
-
-            # Return all comments with the updated comment to the listing page.
-            return render(request, "auctions/listing.html", {
-                        "not_owner": not_owner,
-                        "remove": remove,
-                        "image_URL": listing.image_URL,
-                        "id": listing.id,
-                        "poster": listing.user_ID,
-                        "title": listing.title,
-                        "description": listing.description,
-                        "price": listing.current_price,
-                        "category": listing.category,
-                        "status": listing.status,
-                        "closed": closed,
-                        "comments": listing_comments
-            })
+        # Show the new comment to everyone watching the listing's page.
+        publish(listing_id, "comment", {"user": user_ID.username, "comment": comment_text})
 
-    # GET all of the listing's comments from the DB.
-    listing_comments = []
-    for comment in comments:
-        if comment.listing == listing:
-            listing_comments.append(comment)
+    # Return all comments (with the updated comment) to the listing page.
+    return render (request, "auctions/listing.html", listing_context(request, listing_id))
 
-    return render (request, "auctions/listing.html", {
-        "not_owner": not_owner,
-        "remove": remove,
-        "image_URL": listing.image_URL,
-        "id": listing.id,
-        "poster": listing.user_ID,
-        "title": listing.title,
-        "description": listing.description,
-        "price": listing.current_price,
-        "category": listing.category,
-        "status": listing.status,
-        "closed": closed,
-        "comments": listing_comments
-    })
+
+# The live update stream for a listing page. Streams are served by auctions.live when the site runs under ASGI;
+# under WSGI there are no live updates, and 204 No Content tells the browser not to keep reconnecting.
+def listing_events(request, listing_id):
+    return HttpResponse(status=204)
 
 
 # Returns a user's watchlist to them.
@@ -550,21 +424,70 @@ def comment(request, listing_id):
 def watchlist(request):
     user_ID = request.user
 
-    # Get all rows watched by the logged-in user.
-    listings = []
-    for row in WatchList.objects.all():
-        if row.user_ID == user_ID:
-            # This row's single_listing_watched field's foreign key is the primary key of the actual listing,
-            # so we can reference that listing and all its fields through that foreign key id.
-            listing = AuctionListing.objects.get(pk=row.single_listing_watched.id)
-            # We then attach that referenced listing to a list to be used in the Django templating language.
-            listings.append(listing)
-            
+    # Get the rows watched by the logged-in user, most recently added first, one page at a time. Each row's
+    # single_listing_watched foreign key is joined in the same query, so we get the actual listings and all
+    # their fields without looking each one up.
+    rows = WatchList.objects.filter(user_ID=user_ID).select_related("single_listing_watched")
+    rows, next_cursor = keyset_page(rows, ("-id",), request.GET.get("cursor"))
+
+    # We then put the referenced listings in a list to be used in the Django templating language.
+    listings = [row.single_listing_watched for row in rows]
+
     return render(request, "auctions/watchlist.html", {
-        "listings": listings
+        "listings": listings,
+        "next_cursor": next_cursor
     })
 
 
+# Serves uploaded images and their thumbnails. Their names are made from their contents, so a name always means the
+# same file and browsers can keep it for a year without asking again.
+def media(request, path):
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    response["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
+
+
+# Shows the leaderboards (see leaderboards.py): the active listings with the most bids and the fastest-rising prices
+# in the last hour, the most watched and the ones ending soonest. The boards come from the cache, and so do most of
+# their cards, which are all looked up in one trip.
+@read_only
+def leaderboards(request):
+    boards = cached_leaderboards()
+    rows = [row for name in BOARDS for row in boards[name]]
+    cards = iter(listing_cards([AuctionListing(id=id, version=version) for id, version, _ in rows]))
+
+    return render(request, "auctions/leaderboards.html", {
+        name: [(next(cards), value) for _, _, value in boards[name]] for name in BOARDS
+    })
+
+
+# Serves the static files, such as the stylesheet, from STATIC_ROOT (see staticfiles.py).
+def static(request, path):
+    return serve_static(request, path)
+
+
+# Shows staff the recently profiled requests in this server process (see profiling.py): the slowest views, the
+# slowest queries and the latest requests.
+@staff_member_required
+def profiling(request):
+    return render(request, "auctions/profiling.html", summary())
+
+
+# The JSON API for listings, bids and comments (see api.py), e.g. /api/listings?ids=1,2,3&fields=title,price.
+# Every request is answered with a single query. Bidders and comment authors are only sent to logged-in users.
+@read_only
+def api(request, resource):
+    if resource not in RESOURCES:
+        raise Http404("No such resource.")
+
+    try:
+        data = query(resource, request.GET, request.user.is_authenticated)
+    except ApiError as error:
+        return JsonResponse({"error": str(error)}, status=400)
+
+    return JsonResponse(data)
+
+
 ################################################
 ############### Helper Functions ###############
 ################################################ 
@@ -579,46 +502,141 @@ def is_closed(listing):
     return closed
 
 
-# Helper function for bid() fuction that determines if an amount of a bid is greater than the current 
-# listing price of a listing.
-def enough(amount, listing_id):
-    if amount <= AuctionListing.objects.get(pk=listing_id).current_price or amount is None:
-        not_enough = True
-    else:
-        not_enough = False
-        
-    return not_enough
+# Helper function that adds one to a listing's comment count, in the database itself so that comments made at the
+# same time all count, and gives the listing a new version (its card shows the count), in one UPDATE.
+def count_comment(listing_id):
+    AuctionListing.objects.filter(id=listing_id).update(version=F("version") + 1, comment_count=F("comment_count") + 1)
+
+
+# Helper function that adds a listing to a user's watchlist with INSERT OR IGNORE, so a row that is already there
+# (added by another request in the meantime) is left alone. Returns True if the row was inserted. (bulk_create with
+# ignore_conflicts doesn't say whether it inserted anything.)
+def add_watcher(user, listing_id):
+    table = WatchList._meta.db_table
+    user_column = WatchList._meta.get_field("user_ID").column
+    listing_column = WatchList._meta.get_field("single_listing_watched").column
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT OR IGNORE INTO "{table}" ("{user_column}", "{listing_column}") VALUES (%s, %s)',
+            [user.id, listing_id]
+        )
+        return cursor.rowcount == 1
+
+
+# Helper function that adds change (1 or -1) to a listing's watcher count, in the database itself so that watchers
+# added and removed at the same time all count, and gives the listing a new version, in one UPDATE. A count that has
+# drifted to zero isn't taken below it.
+def count_watchers(listing_id, change):
+    listings = AuctionListing.objects.filter(id=listing_id)
+    if change < 0:
+        listings = listings.filter(watcher_count__gte=-change)
+    listings.update(version=F("version") + 1, watcher_count=F("watcher_count") + change)
+
+
+# Helper function that gets one page of a listing's comments, oldest first, along with the cursor for the next page.
+# The (listing, id) index finds the page directly and the comment authors are joined in the same query, so the
+# template doesn't look each one up separately.
+def get_comments(request, listing_id):
+    comments = ListingComment.objects.filter(listing_id=listing_id).select_related("user_ID")
+
+    return keyset_page(comments, ("id",), request.GET.get("comments"))
+
+
+# A helper function that returns one page of active listings for the homepage or a category page, in the order and
+# price range chosen in the query string (see BrowseForm), along with the form and the cursor for the next page.
+# Price ranges and price orders are read from the (status, current_price) and (status, category, current_price)
+# indexes, so the database walks the index in price order instead of sorting every matching listing.
+def browse_page(request, active_listings):
+    form = BrowseForm(request.GET)
+    form.is_valid()
+    choices = form.cleaned_data
+
+    if choices.get("min_price") is not None:
+        active_listings = active_listings.filter(current_price__gte=choices["min_price"])
+    if choices.get("max_price") is not None:
+        active_listings = active_listings.filter(current_price__lte=choices["max_price"])
+
+    # Only the fields the page is ordered by and the id and version of each listing are loaded here, since the listing
+    # cards are mostly served from the cache.
+    ordering = SORTS[choices.get("sort") or "newest"]
+    active_listings = active_listings.only(*CARD_KEY_FIELDS, *(field.lstrip("-") for field in ordering))
+    listings, next_cursor = keyset_page(active_listings, ordering, request.GET.get("cursor"))
+
+    return form, listings, next_cursor
+
+
+# A helper function that returns the valid order and price range choices of a BrowseForm as a query string, so the
+# link to the next page keeps them.
+def browse_query(form):
+    return urlencode({name: value for name, value in form.cleaned_data.items() if value not in (None, "")})
+
+
+# A helper function that returns the set of listing IDs in the logged-in user's watchlist. It is looked up once per
+# request (from the unique (user_ID, single_listing_watched) index) and remembered on the request, so every helper
+# that asks during the same request shares it. Views that change the watchlist update the set as well.
+def watched_ids(request):
+    if not hasattr(request, "_watched_ids"):
+        if request.user.is_authenticated:
+            request._watched_ids = set(
+                WatchList.objects.filter(user_ID=request.user).values_list("single_listing_watched_id", flat=True)
+            )
+        else:
+            request._watched_ids = set()
+
+    return request._watched_ids
 
 
 # A helper function that defines whether the listing is already in the user's watchlist, if it's already being "watched".
 def watched(request, listing_id):
-    # If the table is empty, give remove a value of false.
-    if not WatchList.objects.exists():
-            remove = False
+    remove = listing_id in watched_ids(request)
 
-    user = request.user
-
-    for row in WatchList.objects.all():
-        if row.user_ID == user and row.single_listing_watched.id == listing_id:
-            remove = True
-            return remove
-        else:
-            remove = False
-    
     return remove
 
 
 # A helper function that determines if a page listing is owned by the currently logged-in user.
-def is_owner(request, listing_id):
-    listing = AuctionListing.objects.get(id=listing_id)
+def is_owner(request, listing):
     user = request.user
 
     # If the user_id of the page listing is not equivalent to the user id of the logged-in user,
     # then we return a boolean signifying that we should add a "Add to Watchlist" button in
     # the HTML since the logged-in user doesn't own the page listing.
-    if not listing.user_ID == user:
+    if not listing.user_ID_id == user.id:
         not_owner = True
     else:
         not_owner = False
 
     return not_owner
+
+
+# A helper function that builds everything listing.html needs for a listing. It takes a fixed number of queries
+# however many comments or bids the listing has: one for the listing (with its poster, category and winner joined
+# in), one for the page of comments and, for a logged-in user, one for their watched listing IDs.
+# Any extra values for the page, such as messages, can be passed in as keyword arguments.
+def listing_context(request, listing_id, **extra):
+    listing = AuctionListing.objects.select_related("user_ID", "category", "winner").get(id=listing_id)
+    listing_comments, comments_cursor = get_comments(request, listing_id)
+
+    context = {
+        # See if currently logged-in user is the owner of the listing. If they are, the "Add to watchlist" button
+        # will not be displayed.
+        "not_owner": is_owner(request, listing),
+        # See if user needs the Remove button. If they do, we will return it the HTML.
+        "remove": watched(request, listing_id),
+        "image_URL": listing.small_image_URL,
+        "image_2x_URL": listing.medium_image_URL,
+        "id": listing.id,
+        "poster": listing.user_ID,
+        "title": listing.title,
+        "description": listing.description,
+        "price": listing.current_price,
+        "category": listing.category,
+        "status": listing.status,
+        "ends_at": listing.ends_at,
+        "closed": is_closed(listing),
+        "winner": listing.winner,
+        "comments": listing_comments,
+        "comments_cursor": comments_cursor
+    }
+    context.update(extra)
+
+    return context
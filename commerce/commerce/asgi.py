@@ -13,4 +13,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'commerce.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Live listing updates are streamed by auctions.live in front of Django (imported once Django is set up).
+from auctions.live import with_events  # noqa: E402
+
+application = with_events(django_application)
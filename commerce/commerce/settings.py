@@ -31,7 +31,7 @@ ALLOWED_HOSTS = []
 # Application definition
 
 INSTALLED_APPS = [
-    'auctions',
+    'auctions.apps.AuctionsConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -41,6 +41,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so that it times everything else (see auctions/profiling.py).
+    'auctions.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -52,17 +54,27 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'commerce.urls'
 
+# Where templates are found: the project's template directories, then each app's templates/ directory.
+_template_loaders = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # The Django template backend, timing renders for request profiling.
+        'BACKEND': 'auctions.profiling.ProfiledTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # The same loaders Django uses when none are given: with DEBUG off, each template is compiled once per
+            # process and kept; with DEBUG on, it's compiled on every render, so changes show up without a restart.
+            'loaders': _template_loaders if DEBUG else [('django.template.loaders.cached.Loader', _template_loaders)],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'auctions.context_processors.watchlist',
             ],
         },
     },
@@ -77,12 +89,72 @@ WSGI_APPLICATION = 'commerce.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'NAME': os.environ.get('SQLITE_PATH', os.path.join(BASE_DIR, 'db.sqlite3')),
+        # Tests use a database file instead of SQLite's shared in-memory database, which fails with
+        # "database table is locked" instead of waiting when tests write from several threads at once.
+        'TEST': {
+            'NAME': os.path.join(BASE_DIR, 'test_db.sqlite3'),
+        },
+    }
+}
+
+# Production SQLite profile.
+# Set SQLITE_PRODUCTION=1 in the environment when several workers share the database file. Connections then
+# use WAL journaling (so readers don't wait for writers) and the pragmas in auctions/sqlite.py, wait up to
+# SQLITE_BUSY_TIMEOUT seconds for a write lock instead of failing with "database is locked", and are kept open
+# between requests. Read-only views are sent to a separate read-only connection by auctions.sqlite.ReadRouter.
+
+SQLITE_PRODUCTION = os.environ.get('SQLITE_PRODUCTION') == '1'
+
+SQLITE_BUSY_TIMEOUT = float(os.environ.get('SQLITE_BUSY_TIMEOUT', 20))
+
+if SQLITE_PRODUCTION:
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('SQLITE_CONN_MAX_AGE', 600))
+    DATABASES['default']['OPTIONS'] = {
+        'timeout': SQLITE_BUSY_TIMEOUT,
+    }
+    DATABASES['read'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        # SQLite URI that opens the same file read-only.
+        'NAME': 'file:%s?mode=ro' % DATABASES['default']['NAME'],
+        'CONN_MAX_AGE': DATABASES['default']['CONN_MAX_AGE'],
+        'OPTIONS': {
+            'timeout': SQLITE_BUSY_TIMEOUT,
+        },
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    }
+    DATABASE_ROUTERS = ['auctions.sqlite.ReadRouter']
+
+# Cache
+# https://docs.djangoproject.com/en/3.0/topics/cache/
+# Used for the rendered listing cards on the homepage and category pages. A per-process memory cache by default;
+# point this at a shared cache (e.g. Memcached or Redis) when running several workers.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
     }
 }
 
 AUTH_USER_MODEL = 'auctions.User'
 
+# Keeps logged-in users in the cache instead of loading them on every request (see auctions/backends.py).
+# ModelBackend stays listed so that sessions started before the cached backend was added (which name ModelBackend)
+# stay logged in. New logins use the cached backend.
+AUTHENTICATION_BACKENDS = [
+    'auctions.backends.CachedModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
+# How long a logged-in user is kept in the cache (in seconds). Saving a user removes them from it straight away, but
+# only from the cache of the process that saved them if the cache isn't shared, so this is kept short.
+USER_CACHE_TIMEOUT = 60 * 5
+
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
 
@@ -120,3 +192,28 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/3.0/howto/static-files/
 
 STATIC_URL = '/static/'
+
+# Where collectstatic puts the static files, with fingerprinted names and compressed copies, for the server to send
+# them from (see auctions/staticfiles.py).
+STATIC_ROOT = os.environ.get('STATIC_ROOT', os.path.join(BASE_DIR, 'staticfiles'))
+
+STATICFILES_STORAGE = 'auctions.staticfiles.CompressedManifestStorage'
+
+
+# Uploaded listing images and their thumbnails (see auctions/images.py).
+
+MEDIA_ROOT = os.environ.get('MEDIA_ROOT', os.path.join(BASE_DIR, 'media'))
+
+MEDIA_URL = '/media/'
+
+# The number of worker processes per server process that make thumbnails. 0 makes them during the request instead.
+THUMBNAIL_WORKERS = int(os.environ.get('THUMBNAIL_WORKERS', 2))
+
+
+# Request profiling (see auctions/profiling.py).
+
+# The fraction of requests that are profiled, from 0 (none) to 1 (all).
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 1 if DEBUG else 0.01))
+
+# How many of the most recent profiled requests each server process keeps for the profiling page.
+PROFILING_BUFFER_SIZE = 200